@@ -8,13 +8,14 @@ version_added: "2.7"
 
 description:
     - "Cleanup files based on some criteria in a path"
-    - "Ported statinfo, age, size filter functions from ansible find module"
+    - "Ported the age and size filters from ansible find module"
 
 options:
   path_pattern:
     description:
       - The path pattern/glob style pattern of path where the files need to be deleted
-      - This doesn't includes sub-directories 
+      - This doesn't includes sub-directories, unless recurse is set
+      - The directories matching the pattern are read with scandir and streamed through the filters, the whole glob result is never held in memory
     type: str
     required: true
 
@@ -28,13 +29,15 @@ options:
   excludes:
     description:
       - The patterns of the files to exclude
+      - The patterns are matched against the file names in a single pass before any stat, the order of the files is kept
     type: list
 
   file_type:
     description: 
-      - To search based on the directory or file
+      - To search based on the directory, file or symbolic link
+      - Symbolic links are never followed, a link to a directory is a link
     default: any
-    choices: ['file', 'directory']
+    choices: ['any', 'file', 'directory', 'link']
     type: str
 
   age:
@@ -56,6 +59,87 @@ options:
       - Filter based on the file size 
       - size can be mentioned in bytes(b)/kilobytes(k)/megabytes(m)/gigabytes(g)/terabytes(t)
 
+  free_bytes:
+    description:
+      - Select the oldest of the matched files, by age_stamp, until their sizes add up to free_bytes
+      - free_bytes can be mentioned in bytes(b)/kilobytes(k)/megabytes(m)/gigabytes(g)/terabytes(t)
+      - The other filters still apply first, use file_type=file as the size of a directory is not the size of its content
+      - Only the selected files are held in memory, in a heap, they are returned oldest first
+    default: None
+    type: str
+
+  keep_bytes:
+    description:
+      - Select all the matched files but the newest ones, by age_stamp, whose sizes add up to at most keep_bytes
+      - keep_bytes can be mentioned in bytes(b)/kilobytes(k)/megabytes(m)/gigabytes(g)/terabytes(t)
+      - Mutually exclusive with free_bytes
+    default: None
+    type: str
+
+  max_listed:
+    description:
+      - Return at most max_listed files in the result, with the summary of all the matched files
+      - Keeps the result of huge match sets from bloating the memory of the controller
+    default: None
+    type: int
+
+  summary_only:
+    description:
+      - Return only the summary of the matched files, the number, total_bytes, oldest and newest of them, and no files
+    default: no
+    type: bool
+
+  list_file:
+    description:
+      - Write all the matched files, one per line, to this file on the target host
+      - The file is written in check mode too, as the audit trail of the files which would be deleted
+    default: None
+    type: path
+
+  recurse:
+    description:
+      - Match the basename of path_pattern in the subdirectories of the path_pattern directories too
+      - Hidden directories are not descended into, nor the directories matching excludes
+      - Every entry is stat at most once, the directory type comes from the directory listing
+      - The files inside a matched directory are deleted with it
+    default: no
+    type: bool
+
+  max_depth:
+    description:
+      - The number of subdirectory levels descended into with recurse, 0 only reads the path_pattern directories
+    default: None
+    type: int
+
+  stat_workers:
+    description:
+      - The number of threads running lstat on the matched files
+      - Raise it on NFS and other high latency filesystems to overlap the stat round trips
+      - No stat is needed when only file_type is filtered, the type comes from the directory entry
+    default: 1
+    type: int
+
+  delete_workers:
+    description:
+      - The number of threads deleting the files with state=absent
+      - Files are unlinked by batches relative to the fd of their directory, matched directories are emptied the same way and removed bottom-up
+    default: 1
+    type: int
+
+  delete_rate:
+    description:
+      - The maximum number of unlink and rmdir calls per second over all the delete_workers
+      - Keeps a large purge from starving the production I/O of the filesystem
+    default: None
+    type: float
+
+  sort:
+    description:
+      - Sort the matched files of each path_pattern
+      - Sorting holds the matched files of a path_pattern in memory, turn it off on huge directories
+    default: yes
+    type: bool
+
 author:
     - Rahul K
 '''
@@ -100,115 +184,627 @@ EXAMPLES = '''
       path_pattern: /tmp/*.log
       state: absent
       size: 5g
+
+# Free 50 GB on the backup volume by deleting the oldest dumps first, check mode shows them
+- cleanup_files:
+      path_pattern: /backup/*.dump
+      state: absent
+      file_type: file
+      free_bytes: 50g
+
+# Keep the newest 200 GB of archives
+- cleanup_files:
+      path_pattern: /archive/*.tar.gz
+      state: absent
+      file_type: file
+      keep_bytes: 200g
+
+# Purge a huge spool, keeping the full list on the host and only a summary in the result
+- cleanup_files:
+      path_pattern: /var/spool/app/*
+      state: absent
+      summary_only: yes
+      list_file: /var/tmp/spool_cleanup.list
+
+# Cleanup the old logs of a retention tree, down to 3 levels and skipping the archive directories
+- cleanup_files:
+      path_pattern: /var/log/apps/*.log
+      state: absent
+      age: 2w
+      recurse: yes
+      max_depth: 3
+      excludes:
+        - archive*
+
+# Purge a huge cache with 16 threads without exceeding 2000 deletions per second
+- cleanup_files:
+      path_pattern: /data/cache/*
+      state: absent
+      delete_workers: 16
+      delete_rate: 2000
+
+# Cleanup old logs on NFS with 32 parallel stat calls
+- cleanup_files:
+      path_pattern: /nfs/logs/*.log
+      state: absent
+      age: 4w
+      stat_workers: 32
+      sort: no
 '''
 RETURN = '''
 files:
-    description: The list of files to be deleted
+    description: The list of files to be deleted, the first max_listed of them when it is set
+    returned: unless summary_only is set
     type: list
+truncated:
+    description: Whether files holds fewer files than matched
+    returned: when max_listed is set
+    type: bool
+total_bytes:
+    description: The total size of the matched files
+    returned: when max_listed or summary_only is set
+    type: int
+oldest:
+    description: The path and the age_stamp time of the oldest matched file
+    returned: when max_listed or summary_only is set
+    type: dict
+newest:
+    description: The path and the age_stamp time of the newest matched file
+    returned: when max_listed or summary_only is set
+    type: dict
+list_file:
+    description: The file on the target host listing all the matched files
+    returned: when list_file is set
+    type: str
 matched: 
     description: The numer of files matching the criteria
     type: str
 msg: 
     description: The comment of action which has taken place
     type: str
+freed_bytes:
+    description: The bytes of the selected files, freed or to be freed with state=list and check mode
+    returned: when free_bytes or keep_bytes is set
+    type: int
+deleted:
+    description: The number of files and directories deleted, the content of the matched directories included
+    returned: when state is absent
+    type: int
+failed_count:
+    description: The number of files and directories which could not be deleted
+    returned: when state is absent
+    type: int
+failures:
+    description: The first 100 failed deletions as "path: error"
+    returned: when state is absent
+    type: list
+deleted_per_second:
+    description: The deletion throughput achieved
+    returned: when state is absent
+    type: float
 '''
 
 #!/usr/bin/env python
 import os
 import glob
+import heapq
+import itertools
 import operator
 import re
 import stat
 import time
-import shutil
 import fnmatch
+import threading
+from collections import deque
+from multiprocessing.pool import ThreadPool
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
 
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils._text import to_bytes
+
+# Number of lstat calls queued per stat worker
+QUEUE_DEPTH = 16
+
+# Number of names unlinked per task of the delete workers
+DELETE_BATCH = 256
+
+# Number of failed deletions listed in the result
+MAX_FAILURES = 100
+
+# unlink relative to a directory fd is available from Python 3.3
+UNLINK_DIR_FD = os.unlink in getattr(os, 'supports_dir_fd', ())
+
+# The stat file type of each file_type
+FILE_TYPES = {
+    'directory': stat.S_IFDIR,
+    'file': stat.S_IFREG,
+    'link': stat.S_IFLNK,
+}
+
+def scan_files(path_pattern):
+    '''stream the (path, DirEntry) of the files matching path_pattern,
+    the DirEntry is None when the match does not come from scandir'''
+    dirname, pattern = os.path.split(path_pattern)
+    if scandir is None or not glob.has_magic(pattern):
+        for file in glob.iglob(path_pattern):
+            yield file, None
+        return
+    if glob.has_magic(dirname):
+        dirnames = glob.iglob(dirname)
+    else:
+        dirnames = [dirname]
+    match = re.compile(fnmatch.translate(pattern)).match
+    # Like glob, hidden files only match patterns starting with a dot
+    hidden = pattern.startswith('.')
+    for dirname in dirnames:
+        try:
+            entries = scandir(dirname or os.curdir)
+        except OSError:
+            continue
+        for entry in entries:
+            if (hidden or not entry.name.startswith('.')) and match(entry.name):
+                yield os.path.join(dirname, entry.name), entry
+
+def walk_files(path_pattern, max_depth, excludes):
+    '''stream the (path, DirEntry) of the files matching the basename of
+    path_pattern in its directories and their subdirectories, down to max_depth
+    levels below them. The entries matching excludes are skipped and excluded
+    directories are not descended into, the directory type comes from the
+    DirEntry so no entry is stat by the walk'''
+    dirname, pattern = os.path.split(path_pattern)
+    if glob.has_magic(dirname):
+        dirnames = glob.iglob(dirname)
+    else:
+        dirnames = [dirname]
+    match = re.compile(fnmatch.translate(pattern)).match
+    excluded = exclude_matcher(excludes) if excludes else None
+    # Like glob, hidden files only match patterns starting with a dot and
+    # hidden directories are not descended into
+    hidden = pattern.startswith('.')
+    for top in dirnames:
+        stack = [(top, 0)]
+        while stack:
+            dirname, depth = stack.pop()
+            subdirs = []
+            for name, path, entry, is_dir in _list_entries(dirname):
+                if excluded is not None and excluded(name):
+                    continue
+                if (hidden or not name.startswith('.')) and match(name):
+                    yield path, entry
+                if is_dir and not name.startswith('.') and (max_depth is None or depth < max_depth):
+                    subdirs.append((path, depth + 1))
+            # Descend in the order of the directory listing
+            stack.extend(reversed(subdirs))
+
+def _list_entries(dirname):
+    '''list the (name, path, DirEntry, is_dir) of a directory, symlinks to
+    directories are not directories. DirEntry is None without scandir'''
+    try:
+        if scandir is None:
+            entries = []
+            for name in os.listdir(dirname or os.curdir):
+                path = os.path.join(dirname, name)
+                entries.append((name, path, None, os.path.isdir(path) and not os.path.islink(path)))
+            return entries
+        entries = []
+        for entry in scandir(dirname or os.curdir):
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+            except OSError:
+                is_dir = False
+            entries.append((entry.name, os.path.join(dirname, entry.name), entry, is_dir))
+        return entries
+    except OSError:
+        return []
+
+def stat_files(matches, need_stat, workers, skipped):
+    '''stream the (path, DirEntry, stat) of the matches, the lstat calls run on
+    a bounded pool of workers. stat is None when need_stat is False and the
+    DirEntry knows the file type, files which cannot be stat are added to skipped'''
+    stats = _bounded_imap(_lstat_worker, ((match, need_stat) for match in matches),
+                          workers, workers * QUEUE_DEPTH)
+    for fsname, entry, st in stats:
+        if st is False:
+            skipped.append(fsname)
+        else:
+            yield fsname, entry, st
+
+def _lstat(match, need_stat):
+    fsname, entry = match
+    if entry is not None and not need_stat:
+        return fsname, entry, None
+    try:
+        if entry is not None:
+            # DirEntry caches the stat, the walk may already have it
+            return fsname, entry, entry.stat(follow_symlinks=False)
+        return fsname, entry, os.lstat(fsname)
+    except Exception:
+        return fsname, entry, False
+
+def _lstat_worker(args):
+    return _lstat(*args)
+
+def _bounded_imap(func, iterable, workers, depth):
+    '''map func over iterable on a pool of workers threads with at most depth
+    calls in flight, the results keep the order of iterable'''
+    if workers == 1:
+        for item in iterable:
+            yield func(item)
+        return
+    pool = ThreadPool(workers)
+    pending = deque()
+    try:
+        for item in iterable:
+            pending.append(pool.apply_async(func, (item,)))
+            if len(pending) >= depth:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+    finally:
+        pool.terminate()
+        pool.join()
+
+def filter_files(stats, passes, entry_passes, trees=None):
+    '''stream the (path, stat) passing the stat_filter check, or the
+    entry_filter check when no stat was needed and stat is None. The paths
+    of the directories passing are added to trees, from the stat or the
+    DirEntry type'''
+    for fsname, entry, st in stats:
+        if st is None:
+            if not entry_passes(entry):
+                continue
+            if trees is not None and _entry_is_dir(entry):
+                trees.add(fsname)
+        elif passes(st):
+            if trees is not None and stat.S_ISDIR(st.st_mode):
+                trees.add(fsname)
+        else:
+            continue
+        yield fsname, st
 
-def list_files(path_pattern):
-    '''list file in the path_pattern'''
-    for file in sorted(glob.glob(path_pattern)):
-        yield file
+def _entry_is_dir(entry):
+    try:
+        return entry.is_dir(follow_symlinks=False)
+    except OSError:
+        return False
 
-def filter_with_excludes(filelist,excludes):
-    '''filter files excluding some based on pattern'''
+def oldest_to_free(matches, timestamp, free_bytes):
+    '''select the oldest of the (path, stat) matches whose sizes add up to
+    free_bytes, returns their (path, stat) oldest first. A max-heap of the
+    selection is kept, the newest file is dropped as soon as the others
+    are enough, so only the selected files are held in memory.
+    Files of the same age are ordered as they are matched'''
+    get_time = operator.attrgetter('st_%s' % timestamp)
+    heap = []
+    total = 0
+    for seq, (fsname, st) in enumerate(matches):
+        key = (-get_time(st), -seq)
+        if total >= free_bytes and (not heap or key < heap[0][:2]):
+            continue
+        heapq.heappush(heap, key + (fsname, st))
+        total += st.st_size
+        while heap and total - heap[0][3].st_size >= free_bytes:
+            total -= heapq.heappop(heap)[3].st_size
+    heap.sort(reverse=True)
+    return [(fsname, st) for _, _, fsname, st in heap]
+
+def oldest_over_keep(matches, timestamp, keep_bytes):
+    '''select all but the newest of the (path, stat) matches whose sizes add
+    up to at most keep_bytes, returns their (path, stat) oldest first.
+    A min-heap of the kept files is evicted into the selection when they
+    exceed keep_bytes, the matches older than an evicted file are selected
+    right away. Files of the same age are ordered as they are matched'''
+    get_time = operator.attrgetter('st_%s' % timestamp)
+    heap = []
+    total = 0
+    cutoff = None
+    selected = []
+    for seq, (fsname, st) in enumerate(matches):
+        item = (get_time(st), seq, fsname, st)
+        if cutoff is not None and item[:2] < cutoff:
+            selected.append(item)
+            continue
+        heapq.heappush(heap, item)
+        total += st.st_size
+        while total > keep_bytes:
+            evicted = heapq.heappop(heap)
+            total -= evicted[3].st_size
+            selected.append(evicted)
+            cutoff = evicted[:2] if cutoff is None else max(cutoff, evicted[:2])
+    selected.sort()
+    return [(fsname, st) for _, _, fsname, st in selected]
+
+class MatchSummary(object):
+    '''count the (path, stat) of the matched files flowing through add, with
+    their total size and the oldest and newest of them by age_stamp'''
+
+    def __init__(self, timestamp):
+        self.get_time = operator.attrgetter('st_%s' % timestamp)
+        self.count = 0
+        self.total_bytes = 0
+        self.oldest = None
+        self.newest = None
+
+    def add(self, matches):
+        for fsname, st in matches:
+            self.count += 1
+            self.total_bytes += st.st_size
+            entry = (self.get_time(st), fsname)
+            if self.oldest is None or entry < self.oldest:
+                self.oldest = entry
+            if self.newest is None or entry > self.newest:
+                self.newest = entry
+            yield fsname, st
+
+    def result(self):
+        summary = dict(total_bytes=self.total_bytes)
+        for name in ('oldest', 'newest'):
+            entry = getattr(self, name)
+            summary[name] = None if entry is None else dict(path=entry[1], time=entry[0])
+        return summary
+
+def write_list(list_file, filelist):
+    '''write the files of filelist one per line to list_file, through a
+    temporary file renamed over it'''
+    tmp_file = '%s.%d.tmp' % (list_file, os.getpid())
+    try:
+        with open(tmp_file, 'wb') as fp:
+            for fsname in filelist:
+                fp.write(to_bytes(fsname, errors='surrogate_or_strict') + b'\n')
+        os.rename(tmp_file, list_file)
+    except Exception:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
+
+def parse_size(size):
+    '''convert a size with an optional b/k/m/g/t unit to bytes, None when
+    it is not valid'''
+    m = re.match(r"^(-?\d+)(b|k|m|g|t)?$", size.lower())
+    bytes_per_unit = {"b": 1, "k": 1024, "m": 1024**2, "g": 1024**3, "t": 1024**4}
+    if m:
+        return int(m.group(1)) * bytes_per_unit.get(m.group(2), 1)
+    return None
+
+def filter_with_excludes(matches, excludes):
+    '''filter the (path, DirEntry) matches whose basename matches one of
+    the excludes patterns, in one pass which keeps the order'''
+    excluded = exclude_matcher(excludes)
+    for match in matches:
+        if not excluded(os.path.basename(match[0])):
+            yield match
+
+def exclude_matcher(excludes):
+    '''build the check of a basename against all the excludes patterns once,
+    literal names, prefix* and *suffix patterns are looked up in indexes and
+    the other patterns are compiled into a single regex'''
+    literals = set()
+    prefixes = []
+    suffixes = []
+    patterns = []
     for pattern in excludes:
-        excluded_files = [file for file in filelist if fnmatch.fnmatch(os.path.basename(file), pattern)]
-        filelist = list(set(filelist) - set(excluded_files))
-    return filelist
-
-def agefilter(st, now, age, timestamp):
-    '''filter files older than age'''
-    if age is None:
-        return True
-    elif age >= 0 and now - st.__getattribute__("st_%s" % timestamp) >= abs(age):
-        return True
-    elif age < 0 and now - st.__getattribute__("st_%s" % timestamp) <= abs(age):
-        return True
-    return False
-
-
-def sizefilter(st, size):
-    '''filter files greater than size'''
-    if size is None:
-        return True
-    elif size >= 0 and st.st_size >= abs(size):
-        return True
-    elif size < 0 and st.st_size <= abs(size):
+        if not glob.has_magic(pattern):
+            literals.add(pattern)
+        elif pattern.endswith('*') and not glob.has_magic(pattern[:-1]):
+            prefixes.append(pattern[:-1])
+        elif pattern.startswith('*') and not glob.has_magic(pattern[1:]):
+            suffixes.append(pattern[1:])
+        else:
+            patterns.append(fnmatch.translate(pattern))
+    prefixes = tuple(prefixes)
+    suffixes = tuple(suffixes)
+    regex = re.compile('|'.join(patterns)).match if patterns else None
+
+    def excluded(name):
+        return (name in literals
+                or (prefixes and name.startswith(prefixes))
+                or (suffixes and name.endswith(suffixes))
+                or (regex is not None and regex(name) is not None))
+    return excluded
+
+def stat_filter(now, age, timestamp, size, file_type):
+    '''build the check of a stat result against the age, size and file_type
+    filters once, the check only compares st_mode, st_size and st_*time with
+    the precomputed limits'''
+    checks = []
+    if age is not None:
+        get_time = operator.attrgetter('st_%s' % timestamp)
+        # Older than age when age is positive, newer than -age otherwise
+        limit = now - abs(age)
+        if age >= 0:
+            checks.append(lambda st: get_time(st) <= limit)
+        else:
+            checks.append(lambda st: get_time(st) >= limit)
+    if size is not None:
+        # Larger than size when size is positive, smaller than -size otherwise
+        if size >= 0:
+            checks.append(lambda st: st.st_size >= size)
+        else:
+            checks.append(lambda st: st.st_size <= -size)
+    if file_type != 'any':
+        fmt = FILE_TYPES[file_type]
+        checks.append(lambda st: stat.S_IFMT(st.st_mode) == fmt)
+    if not checks:
+        return lambda st: True
+    if len(checks) == 1:
+        return checks[0]
+
+    def passes(st):
+        for check in checks:
+            if not check(st):
+                return False
         return True
-    return False
+    return passes
 
-def file_type_filter(st, file_type):
-    '''filter files if same file_type'''
+def entry_filter(file_type):
+    '''build the check of a DirEntry against file_type, the type comes from
+    the directory listing'''
     if file_type == 'any':
-        return True
-    elif operator.getitem(statinfo(st),'isdir') and file_type == "directory":
-        return True
-    elif operator.getitem(statinfo(st),'isreg') and file_type == "file":
-        return True
+        return lambda entry: True
+    is_type = {
+        'directory': lambda entry: entry.is_dir(follow_symlinks=False),
+        'file': lambda entry: entry.is_file(follow_symlinks=False),
+        'link': lambda entry: entry.is_symlink(),
+    }[file_type]
+
+    def passes(entry):
+        try:
+            return is_type(entry)
+        except OSError:
+            return False
+    return passes
+
+def delete_files(filelist, workers=1, rate=None, trees=None):
+    '''delete the files and the directory trees of filelist, returns the number
+    of entries deleted and the (path, error) of the failures. trees holds the
+    paths known to be directories, without it every path is checked by lstat.
+    Files are unlinked by batches sharing the fd of their directory on a
+    bounded pool of workers, then the directories are removed bottom-up one
+    depth at a time. rate caps the unlink and rmdir calls per second.'''
+    limiter = RateLimiter(rate) if rate else None
+    dirs = []
+    deleted = 0
+    failures = []
+    tasks = _unlink_tasks(filelist, trees, dirs, limiter)
+    for count, errors in _bounded_imap(_unlink_batch, tasks, workers, workers * 2):
+        deleted += count
+        failures.extend(errors)
+    # Remove the deepest directories first, they are empty by now
+    levels = {}
+    for depth, path in dirs:
+        levels.setdefault(depth, []).append((path, limiter))
+    for depth in sorted(levels, reverse=True):
+        for count, errors in _bounded_imap(_rmdir, levels[depth], workers, workers * 2):
+            deleted += count
+            failures.extend(errors)
+    return deleted, failures
+
+def _unlink_tasks(filelist, trees, dirs, limiter):
+    '''yield the (directory, names, limiter) batches to unlink, the matched
+    directories are walked and their (depth, path) added to dirs'''
+    batch_dir = None
+    batch = []
+    if trees is None:
+        trees = set(file for file in filelist if os.path.isdir(file) and not os.path.islink(file))
     else:
-        return False
-
-def statinfo(st):
-    return {
-        'mode': "%04o" % stat.S_IMODE(st.st_mode),
-        'isdir': stat.S_ISDIR(st.st_mode),
-        'ischr': stat.S_ISCHR(st.st_mode),
-        'isblk': stat.S_ISBLK(st.st_mode),
-        'isreg': stat.S_ISREG(st.st_mode),
-        'isfifo': stat.S_ISFIFO(st.st_mode),
-        'islnk': stat.S_ISLNK(st.st_mode),
-        'issock': stat.S_ISSOCK(st.st_mode),
-        'uid': st.st_uid,
-        'gid': st.st_gid,
-        'size': st.st_size,
-        'inode': st.st_ino,
-        'dev': st.st_dev,
-        'nlink': st.st_nlink,
-        'atime': st.st_atime,
-        'mtime': st.st_mtime,
-        'ctime': st.st_ctime,
-        'wusr': bool(st.st_mode & stat.S_IWUSR),
-        'rusr': bool(st.st_mode & stat.S_IRUSR),
-        'xusr': bool(st.st_mode & stat.S_IXUSR),
-        'wgrp': bool(st.st_mode & stat.S_IWGRP),
-        'rgrp': bool(st.st_mode & stat.S_IRGRP),
-        'xgrp': bool(st.st_mode & stat.S_IXGRP),
-        'woth': bool(st.st_mode & stat.S_IWOTH),
-        'roth': bool(st.st_mode & stat.S_IROTH),
-        'xoth': bool(st.st_mode & stat.S_IXOTH),
-        'isuid': bool(st.st_mode & stat.S_ISUID),
-        'isgid': bool(st.st_mode & stat.S_ISGID),
-    }
-    
-def delete_files(filelist):
+        # Only the directories selected are deleted with their content
+        trees = set(file for file in filelist if file in trees)
     for file in filelist:
-        if os.path.islink(file):
-            os.unlink(file)
-        elif os.path.isdir(file):
-            shutil.rmtree(file)
-        else:
-            os.remove(file)
+        if _in_trees(file, trees):
+            # A recursive match inside a matched directory, deleted with it
+            continue
+        if file in trees:
+            for task in _tree_tasks(file, dirs, limiter):
+                yield task
+            continue
+        dirpath, name = os.path.split(file)
+        if dirpath != batch_dir or len(batch) >= DELETE_BATCH:
+            if batch:
+                yield batch_dir or os.curdir, batch, limiter
+            batch_dir = dirpath
+            batch = []
+        batch.append(name)
+    if batch:
+        yield batch_dir or os.curdir, batch, limiter
+
+def _in_trees(path, trees):
+    '''check if one of the parent directories of path is in trees'''
+    parent = os.path.dirname(path)
+    while parent and parent != path:
+        if parent in trees:
+            return True
+        path, parent = parent, os.path.dirname(parent)
+    return False
+
+def _tree_tasks(top, dirs, limiter):
+    '''yield the batches of the files in the tree of top, symlinks are
+    unlinked and not followed'''
+    stack = [(top, 0)]
+    while stack:
+        dirpath, depth = stack.pop()
+        dirs.append((depth, dirpath))
+        names = []
+        try:
+            for name, is_dir in _list_dir(dirpath):
+                if is_dir:
+                    stack.append((os.path.join(dirpath, name), depth + 1))
+                else:
+                    names.append(name)
+        except OSError:
+            # The rmdir of the directory reports it
+            continue
+        for i in range(0, len(names), DELETE_BATCH):
+            yield dirpath, names[i:i + DELETE_BATCH], limiter
+
+def _list_dir(dirpath):
+    '''list the (name, is_dir) of a directory, symlinks are not directories'''
+    if scandir is None:
+        return [(name, os.path.isdir(os.path.join(dirpath, name))
+                 and not os.path.islink(os.path.join(dirpath, name)))
+                for name in os.listdir(dirpath)]
+    return [(entry.name, entry.is_dir(follow_symlinks=False))
+            for entry in scandir(dirpath)]
+
+def _unlink_batch(task):
+    '''unlink names relative to the fd of their directory, so the path is
+    only resolved once per batch'''
+    dirpath, names, limiter = task
+    deleted = 0
+    failures = []
+    dir_fd = None
+    if UNLINK_DIR_FD:
+        try:
+            dir_fd = os.open(dirpath, os.O_RDONLY | getattr(os, 'O_DIRECTORY', 0))
+        except OSError as e:
+            return 0, [(os.path.join(dirpath, name), str(e)) for name in names]
+    try:
+        for name in names:
+            if limiter is not None:
+                limiter.acquire()
+            try:
+                if dir_fd is None:
+                    os.unlink(os.path.join(dirpath, name))
+                else:
+                    os.unlink(name, dir_fd=dir_fd)
+                deleted += 1
+            except OSError as e:
+                failures.append((os.path.join(dirpath, name), str(e)))
+    finally:
+        if dir_fd is not None:
+            os.close(dir_fd)
+    return deleted, failures
+
+def _rmdir(task):
+    path, limiter = task
+    if limiter is not None:
+        limiter.acquire()
+    try:
+        os.rmdir(path)
+    except OSError as e:
+        return 0, [(path, str(e))]
+    return 1, []
+
+class RateLimiter(object):
+    '''pace the calls of all the delete workers to rate per second'''
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self.lock = threading.Lock()
+        self.next_call = time.time()
+
+    def acquire(self):
+        with self.lock:
+            now = time.time()
+            wait = self.next_call - now
+            self.next_call = max(self.next_call, now) + self.interval
+        if wait > 0:
+            time.sleep(wait)
 
 def main():
     module = AnsibleModule(
@@ -220,7 +816,19 @@ def main():
             age=         dict(type='str', default=None),
             age_stamp=   dict(type='str', default="mtime", choices=['atime', 'mtime', 'ctime']),
             size=        dict(type='str', default=None),
+            stat_workers=dict(type='int', default=1),
+            sort=        dict(type='bool', default=True),
+            recurse=     dict(type='bool', default=False),
+            max_depth=   dict(type='int', default=None),
+            delete_workers=dict(type='int', default=1),
+            delete_rate= dict(type='float', default=None),
+            free_bytes=  dict(type='str', default=None),
+            keep_bytes=  dict(type='str', default=None),
+            max_listed=  dict(type='int', default=None),
+            summary_only=dict(type='bool', default=False),
+            list_file=   dict(type='path', default=None),
         ),
+        mutually_exclusive=[['free_bytes', 'keep_bytes']],
         supports_check_mode=True,
     )
 
@@ -242,34 +850,99 @@ def main():
         size = None
     else:
         # convert size to bytes:
-        m = re.match(r"^(-?\d+)(b|k|m|g|t)?$", params['size'].lower())
-        bytes_per_unit = {"b": 1, "k": 1024, "m": 1024**2, "g": 1024**3, "t": 1024**4}
-        if m:
-            size = int(m.group(1)) * bytes_per_unit.get(m.group(2), 1)
-        else:
+        size = parse_size(params['size'])
+        if size is None:
             module.fail_json(size=params['size'], msg="failed to process size")
 
+    # The free_bytes or keep_bytes budget
+    budget = None
+    for option in ('free_bytes', 'keep_bytes'):
+        if params[option] is not None:
+            budget = parse_size(params[option])
+            if budget is None or budget < 0:
+                module.fail_json(msg="failed to process %s" % option, **{option: params[option]})
+            budget_option = option
+
+    if params['stat_workers'] < 1:
+        module.fail_json(stat_workers=params['stat_workers'], msg="stat_workers must be 1 or more")
+
+    if params['max_depth'] is not None and params['max_depth'] < 0:
+        module.fail_json(max_depth=params['max_depth'], msg="max_depth must be 0 or more")
+
+    if params['max_listed'] is not None and params['max_listed'] < 0:
+        module.fail_json(max_listed=params['max_listed'], msg="max_listed must be 0 or more")
+
+    if params['delete_workers'] < 1:
+        module.fail_json(delete_workers=params['delete_workers'], msg="delete_workers must be 1 or more")
+
     now = time.time()
     msg = ''
+    # The file type alone can be read from the directory entries
+    # The summary of max_listed and summary_only needs the size and the age of every match
+    summarize = params['summary_only'] or params['max_listed'] is not None
+    need_stat = age is not None or size is not None or budget is not None or summarize
+    passes = stat_filter(now, age, params['age_stamp'], size, params['file_type'])
+    entry_passes = entry_filter(params['file_type'])
+    skipped = []
+    # The matched directories, deleted with their content
+    trees = set()
+    candidates = []
+    summary = MatchSummary(params['age_stamp']) if summarize else None
     for npath in params['path_pattern']:
-        for fsname in list_files(npath):
-            try:
-                st = os.lstat(fsname)
-            except Exception:
-                msg += "%s was skipped as it does not seem to be a valid file or it cannot be accessed\n" % fsname
-                continue
-            # Filter based on size, age and file_type
-            if agefilter(st, now, age, params['age_stamp']) and sizefilter(st, size) and file_type_filter(st, params['file_type']):
-                filelist.append(fsname)
-            else:
-                continue
-    
-    # Filter based on excludes
-    if params['excludes'] and len(params['excludes']) > 0:
-        filelist = filter_with_excludes(filelist, params['excludes'])  
+        if params['recurse']:
+            # The walk skips the excludes and prunes the excluded directories
+            matches = walk_files(npath, params['max_depth'], params['excludes'])
+        else:
+            matches = scan_files(npath)
+            # Filter based on excludes before any stat
+            if params['excludes']:
+                matches = filter_with_excludes(matches, params['excludes'])
+        stats = stat_files(matches, need_stat, params['stat_workers'], skipped)
+        # Filter based on size, age and file_type
+        matches = filter_files(stats, passes, entry_passes, trees)
+        if summary is not None and budget is None:
+            matches = summary.add(matches)
+        if budget is not None:
+            candidates.append(matches)
+            continue
+        matches = (fsname for fsname, st in matches)
+        if params['sort']:
+            matches = sorted(matches)
+        filelist.extend(matches)
+    freed = None
+    if budget is not None:
+        # Oldest first over all the path_pattern
+        select = oldest_to_free if budget_option == 'free_bytes' else oldest_over_keep
+        selected = select(itertools.chain.from_iterable(candidates), params['age_stamp'], budget)
+        if summary is not None:
+            selected = list(summary.add(selected))
+        filelist = [fsname for fsname, st in selected]
+        freed = sum(st.st_size for fsname, st in selected)
+    for fsname in skipped:
+        msg += "%s was skipped as it does not seem to be a valid file or it cannot be accessed\n" % fsname
     
     # Caluclate total matched files
     matched = len(filelist)
+
+    # The bytes the selected files free, reported by the budget modes
+    report = {}
+    if freed is not None:
+        report['freed_bytes'] = freed
+        if budget_option == 'free_bytes' and freed < budget:
+            module.warn("Only %d bytes of files matched, short of free_bytes" % freed)
+
+    # The full list goes to list_file, the result only carries max_listed files or none
+    if params['list_file']:
+        write_list(params['list_file'], filelist)
+        report['list_file'] = params['list_file']
+    if summary is not None:
+        report.update(summary.result())
+    if not params['summary_only']:
+        if params['max_listed'] is None:
+            report['files'] = filelist
+        else:
+            report['files'] = filelist[:params['max_listed']]
+            report['truncated'] = matched > params['max_listed']
     
     # Handle check_mode
     if module.check_mode == True:
@@ -277,18 +950,26 @@ def main():
             msg = "No files matched to delete"
         else:
             msg = "The files will be deleted"
-        module.exit_json(msg=msg,files=filelist, changed=False, matched=matched)
+        module.exit_json(msg=msg, changed=False, matched=matched, **report)
         
     if matched == 0:
         msg = "No files matched to delete"
-        module.exit_json(msg=msg, files=filelist, changed=False, matched=matched)
+        module.exit_json(msg=msg, changed=False, matched=matched, **report)
     elif matched > 0 and params['state'] == 'list':
         msg = "The files will be deleted"
-        module.exit_json(msg=msg, files=filelist, changed=False, matched=matched)
+        module.exit_json(msg=msg, changed=False, matched=matched, **report)
     elif matched > 0 and params['state'] == 'absent':
-        delete_files(filelist)
+        start = time.time()
+        deleted, failures = delete_files(filelist, params['delete_workers'], params['delete_rate'], trees)
+        elapsed = time.time() - start
+        report.update(deleted=deleted, failed_count=len(failures),
+                      deleted_per_second=round(deleted / elapsed, 1) if elapsed else deleted,
+                      failures=['%s: %s' % failure for failure in failures[:MAX_FAILURES]])
+        if failures:
+            msg = "%d files could not be deleted" % len(failures)
+            module.fail_json(msg=msg, changed=deleted > 0, matched=matched, **report)
         msg = "The files are deleted"
-        module.exit_json(msg=msg, files=filelist, changed=True, matched=matched)
+        module.exit_json(msg=msg, changed=True, matched=matched, **report)
     else:
         msg = "Failed to receive valid parameters"
         module.exit_json(msg=msg)
@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+from __future__ import print_function
+import argparse
+import fnmatch
+import operator
+import os
+import random
+import stat
+import time
+
+import cleanup_files
+
+"""
+Description:
+  - Benchmark the filter stages of the cleanup_files module on synthetic data, no file is created
+  - excludes: the single pass exclude matcher against the per pattern set difference it replaced
+  - filters: the stat_filter checks against the agefilter, sizefilter and file_type_filter calls they replaced
+Usage:
+  cleanup_files_bench.py excludes [-n <names>] [-p <patterns>] [--skip_legacy]
+  cleanup_files_bench.py filters [-n <names>] [--skip_legacy]
+Example:
+  cleanup_files_bench.py excludes -n 1000000 -p 50
+  cleanup_files_bench.py filters -n 2000000
+Note:
+  - Needs the ansible python package, as the module is imported directly
+"""
+
+parser = argparse.ArgumentParser(description='Benchmark the cleanup_files filter stages')
+parser.add_argument('bench', choices=['excludes', 'filters'], help='The stage to benchmark')
+parser.add_argument('-n', '--names', type=int, default=1000000, help='Number of synthetic file names or stat results')
+parser.add_argument('-p', '--patterns', type=int, default=50, help='Number of exclude patterns')
+parser.add_argument('--skip_legacy', action='store_true', help='Do not time the legacy implementation, it is O(patterns x names)')
+
+
+def make_names(count):
+    '''Synthetic log file paths of a few applications'''
+    apps = ['app{:02d}'.format(i) for i in range(40)]
+    return ['/var/log/{0}/{0}-{1:07d}.log{2}'.format(apps[i % len(apps)], i, '.gz' if i % 3 else '')
+            for i in range(count)]
+
+
+def make_patterns(count):
+    '''A mix of literal, prefix, suffix and general glob patterns'''
+    patterns = []
+    for i in range(count):
+        kind = i % 4
+        if kind == 0:
+            patterns.append('app{:02d}-{:07d}.log'.format(i % 40, i * 7))
+        elif kind == 1:
+            patterns.append('app{:02d}-00001*'.format(i % 40))
+        elif kind == 2:
+            patterns.append('*{:03d}.log'.format(i))
+        else:
+            patterns.append('app{:02d}-*[05].log.gz'.format(i % 40))
+    return patterns
+
+
+def legacy_filter_with_excludes(filelist, excludes):
+    '''The implementation filter_with_excludes replaced'''
+    for pattern in excludes:
+        excluded_files = [file for file in filelist if fnmatch.fnmatch(os.path.basename(file), pattern)]
+        filelist = list(set(filelist) - set(excluded_files))
+    return filelist
+
+
+def legacy_agefilter(st, now, age, timestamp):
+    '''filter files older than age'''
+    if age is None:
+        return True
+    elif age >= 0 and now - st.__getattribute__("st_%s" % timestamp) >= abs(age):
+        return True
+    elif age < 0 and now - st.__getattribute__("st_%s" % timestamp) <= abs(age):
+        return True
+    return False
+
+
+def legacy_sizefilter(st, size):
+    '''filter files greater than size'''
+    if size is None:
+        return True
+    elif size >= 0 and st.st_size >= abs(size):
+        return True
+    elif size < 0 and st.st_size <= abs(size):
+        return True
+    return False
+
+
+def legacy_file_type_filter(st, file_type):
+    '''filter files if same file_type'''
+    if file_type == 'any':
+        return True
+    elif operator.getitem(legacy_statinfo(st),'isdir') and file_type == "directory":
+        return True
+    elif operator.getitem(legacy_statinfo(st),'isreg') and file_type == "file":
+        return True
+    else:
+        return False
+
+
+def legacy_statinfo(st):
+    return {
+        'mode': "%04o" % stat.S_IMODE(st.st_mode),
+        'isdir': stat.S_ISDIR(st.st_mode),
+        'ischr': stat.S_ISCHR(st.st_mode),
+        'isblk': stat.S_ISBLK(st.st_mode),
+        'isreg': stat.S_ISREG(st.st_mode),
+        'isfifo': stat.S_ISFIFO(st.st_mode),
+        'islnk': stat.S_ISLNK(st.st_mode),
+        'issock': stat.S_ISSOCK(st.st_mode),
+        'uid': st.st_uid,
+        'gid': st.st_gid,
+        'size': st.st_size,
+        'inode': st.st_ino,
+        'dev': st.st_dev,
+        'nlink': st.st_nlink,
+        'atime': st.st_atime,
+        'mtime': st.st_mtime,
+        'ctime': st.st_ctime,
+        'wusr': bool(st.st_mode & stat.S_IWUSR),
+        'rusr': bool(st.st_mode & stat.S_IRUSR),
+        'xusr': bool(st.st_mode & stat.S_IXUSR),
+        'wgrp': bool(st.st_mode & stat.S_IWGRP),
+        'rgrp': bool(st.st_mode & stat.S_IRGRP),
+        'xgrp': bool(st.st_mode & stat.S_IXGRP),
+        'woth': bool(st.st_mode & stat.S_IWOTH),
+        'roth': bool(st.st_mode & stat.S_IROTH),
+        'xoth': bool(st.st_mode & stat.S_IXOTH),
+        'isuid': bool(st.st_mode & stat.S_ISUID),
+        'isgid': bool(st.st_mode & stat.S_ISGID),
+    }
+
+
+def legacy_filter(stats, now, age, timestamp, size, file_type):
+    '''The filter stage stat_filter replaced'''
+    return [st for st in stats if legacy_agefilter(st, now, age, timestamp)
+            and legacy_sizefilter(st, size) and legacy_file_type_filter(st, file_type)]
+
+
+def make_stats(count, now):
+    '''Synthetic lstat results of files, directories and links of the last 60 days'''
+    random.seed(count)
+    modes = [stat.S_IFREG | 0o644] * 8 + [stat.S_IFDIR | 0o755, stat.S_IFLNK | 0o777]
+    stats = []
+    for i in range(count):
+        mtime = now - random.randint(0, 60 * 86400)
+        stats.append(os.stat_result((random.choice(modes), i, 1, 1, 0, 0, random.randint(0, 1 << 24),
+                                     mtime, mtime, mtime)))
+    return stats
+
+
+def bench_filters(stats, now, skip_legacy):
+    '''Time every age, size and file_type combination, the legacy stage does not handle links'''
+    for age, size, file_type in [(None, None, 'file'), (7 * 86400, None, 'any'), (-86400, 1 << 20, 'file'),
+                                 (14 * 86400, -(1 << 22), 'directory'), (7 * 86400, None, 'link')]:
+        runs = [('stat_filter', lambda: list(filter(cleanup_files.stat_filter(now, age, 'mtime', size, file_type), stats)))]
+        if not skip_legacy and file_type != 'link':
+            runs.append(('legacy', lambda: legacy_filter(stats, now, age, 'mtime', size, file_type)))
+        expected = None
+        for name, run in runs:
+            start = time.time()
+            kept = run()
+            elapsed = time.time() - start
+            if expected is None:
+                expected = kept
+            status = 'ok' if kept == expected else 'MISMATCH'
+            print('{:<12} age={:<8} size={:<9} file_type={:<9} {:>8.3f}s  {} of {} kept  {}'.format(
+                name, str(age), str(size), file_type, elapsed, len(kept), len(stats), status))
+
+
+def bench_excludes(names, patterns, skip_legacy):
+    runs = [('single pass', lambda: [m[0] for m in cleanup_files.filter_with_excludes(
+        ((name, None) for name in names), patterns)])]
+    if not skip_legacy:
+        runs.append(('legacy', lambda: legacy_filter_with_excludes(names, patterns)))
+    expected = None
+    for name, run in runs:
+        start = time.time()
+        kept = run()
+        elapsed = time.time() - start
+        if expected is None:
+            expected = kept
+        status = 'ok' if sorted(kept) == sorted(expected) else 'MISMATCH'
+        print('{:<12} {:>8.3f}s  {} of {} names kept  {}'.format(name, elapsed, len(kept), len(names), status))
+
+
+def main():
+    args = parser.parse_args()
+    if args.bench == 'excludes':
+        bench_excludes(make_names(args.names), make_patterns(args.patterns), args.skip_legacy)
+    elif args.bench == 'filters':
+        now = time.time()
+        bench_filters(make_stats(args.names, now), now, args.skip_legacy)
+
+
+if __name__ == '__main__':
+    main()
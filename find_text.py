@@ -1,45 +1,977 @@
 #!/usr/bin/env python
+from __future__ import print_function
 #Importing the OS Module
 import os
+import re
+import stat
+import json
+import locale
+import fnmatch
+import hashlib
+import sqlite3
 import argparse
+from collections import deque
+from itertools import islice
+from multiprocessing import Pool
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_parse
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+#Function to convert a size with an optional k/m/g unit to bytes
+def parse_size(size):
+    units = {'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}
+    try:
+        if size[-1:].lower() in units:
+            return int(size[:-1]) * units[size[-1].lower()]
+        return int(size)
+    except ValueError:
+        raise argparse.ArgumentTypeError('invalid size %s' % size)
+
+#Function to convert a count which cannot be negative
+def parse_count(count):
+    try:
+        value = int(count)
+    except ValueError:
+        value = -1
+    if value < 0:
+        raise argparse.ArgumentTypeError('invalid count %s' % count)
+    return value
 
 parser = argparse.ArgumentParser(description='Identify files with input strings')
-parser.add_argument('-d', '--dir', type=str, metavar='', required=True, help='Absolute Path of Directory to Search')
-parser.add_argument('-if','--input_file', type=str, metavar='', required=True, help='Absolute Path of Input File')
-args = parser.parse_args()
-
-#Getting the path and input file as user input recommended to input absolute paths
-path = args.dir
-input_file = args.input_file
-
-#Storing the search strings as set variable
-pass_pattern = set([line.strip().split() for line in open(input_file).readlines()][0])
-
-#Function to capture the absolute paths of all files in the path
-def get_absFilePath(path):
-   for fname in os.walk(path):
-       for file in fname[2]:
-           yield os.path.abspath(os.path.join(fname[0], file))
-
-#Function to capture the identified files for the search strings
-def find_string(path,pass_pattern):
-    for file in get_absFilePath(path):
-        if os.path.isfile(file):
-            for string in pass_pattern:
-                with open(file,'r') as file_content:
-                        for num,line in enumerate(file_content,1):
-                            if string in line:
-                                yield string+" - "+file+":"+str(num)
+parser.add_argument('-d', '--dir', type=str, metavar='DIR', required=True, help='Absolute Path of Directory to Search')
+parser.add_argument('-if','--input_file', type=str, metavar='FILE', required=True, help='Absolute Path of Input File, one search spec per line: a string, re:<regex> or word:<word>')
+parser.add_argument('-j', '--jobs', type=int, metavar='N', default=1, help='Number of processes scanning the files, the output is sorted by path with more than 1')
+parser.add_argument('-b', '--bytes', action='store_true', help='Search the UTF-8 encoded strings in the raw bytes of the files, for binaries and huge lines')
+parser.add_argument('--skip_binary', action='store_true', help='Skip the files with a NUL byte in their first 8 KiB')
+parser.add_argument('--include', action='append', metavar='GLOB', help='Only search the files whose name matches this glob, can be repeated')
+parser.add_argument('-e', '--exclude', action='append', metavar='GLOB', help='Skip the files and directories whose name matches this glob, e.g. node_modules, can be repeated')
+parser.add_argument('--max_size', type=parse_size, metavar='SIZE', default=None, help='Skip the files larger than this size, with an optional k/m/g unit')
+parser.add_argument('--max_depth', type=int, metavar='N', default=None, help='Number of subdirectory levels to descend into, 0 only searches the files of the directory')
+parser.add_argument('--xdev', action='store_true', help='Do not descend into directories on other filesystems')
+parser.add_argument('--gitignore', action='store_true', help='Skip the .git directories and the files and directories ignored by the .gitignore files')
+parser.add_argument('-x', '--index', type=str, metavar='PATH', default=None, help='Path of the scan index, unchanged files are not scanned again')
+parser.add_argument('--format', choices=['text', 'jsonl'], default='text', help='Output format, jsonl prints one JSON object per hit with its pattern, path, line and byte offset')
+parser.add_argument('--max_hits', type=parse_count, metavar='N', default=None, help='Stop the search after this many hits')
+parser.add_argument('--max_hits_per_file', type=parse_count, metavar='N', default=None, help='Stop searching a file after this many hits')
+parser.add_argument('-A', '--after_context', type=parse_count, metavar='N', default=None, help='Print N lines of text after the hits, not with -b')
+parser.add_argument('-B', '--before_context', type=parse_count, metavar='N', default=None, help='Print N lines of text before the hits, not with -b')
+parser.add_argument('-C', '--context', type=parse_count, metavar='N', default=0, help='Print N lines of text around the hits, not with -b')
+parser.add_argument('--byte_offset', action='store_true', help='Print the byte offset of the hits in the files after their line number')
+parser.add_argument('-l', '--files_with_matches', action='store_true', help='Only print the path of the files with a hit, each file is searched up to its first hit')
+
+#Pattern sets up to this size are searched pattern by pattern on each line, larger ones with Aho-Corasick
+SUBSTRING_MAX_PATTERNS = 64
+
+#Number of batches submitted per job ahead of the results, so a slow batch does not hold the others back
+BATCHES_PER_JOB = 4
+
+#Size of a batch of files in bytes, or number of files when they are small
+BATCH_BYTES = 1024 * 1024
+BATCH_FILES = 256
+
+#Size of the chunks read by the byte mode
+CHUNK_BYTES = 1024 * 1024
+
+#Size of the first block of a file checked for binary content
+BINARY_SNIFF_BYTES = 8192
+
+#The prefixes of the search specs which are not literal strings
+SPEC_KINDS = ('re', 'word')
+
+#Length of the line the byte mode runs the regexes on across two chunks
+REGEX_OVERLAP = 4096
+
+#Encoding of the text mode, the lines of python 2 are not decoded
+TEXT_ENCODING = None if str is bytes else locale.getpreferredencoding(False)
+
+#Function to read the search specs of the input file, one per line
+#A line is a literal string, or a regex with a re: prefix, or a whole word with a word: prefix
+def read_patterns(input_file):
+    patterns = set()
+    with open(input_file) as fp:
+        for line in fp:
+            spec = line.strip()
+            if not spec:
+                continue
+            kind, text = parse_spec(spec)
+            if kind == 're':
+                try:
+                    re.compile(text)
+                except re.error as e:
+                    raise ValueError('invalid regex %s: %s' % (spec, e))
+            patterns.add(spec)
+    return patterns
+
+#Class of the entries of a directory, for the Pythons without scandir
+class FileEntry(object):
+    def __init__(self, dirpath, name):
+        self.name = name
+        self.path = os.path.join(dirpath, name)
+        self.stats = {}
+
+    def stat(self, follow_symlinks=True):
+        if follow_symlinks not in self.stats:
+            self.stats[follow_symlinks] = os.stat(self.path) if follow_symlinks else os.lstat(self.path)
+        return self.stats[follow_symlinks]
+
+    def is_dir(self, follow_symlinks=True):
+        return stat.S_ISDIR(self.stat(follow_symlinks).st_mode)
+
+    def is_file(self, follow_symlinks=True):
+        return stat.S_ISREG(self.stat(follow_symlinks).st_mode)
+
+#Function to list the entries of a directory
+def list_dir(dirpath):
+    if scandir is not None:
+        return list(scandir(dirpath))
+    return [FileEntry(dirpath, name) for name in os.listdir(dirpath)]
+
+#Function to convert a .gitignore glob to a regex, * and ? do not match a /
+def gitignore_regex(pattern):
+    regex = ''
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith('**/', i):
+            regex += '(?:.*/)?'
+            i += 3
+        elif pattern.startswith('**', i):
+            regex += '.*'
+            i += 2
+        elif pattern[i] == '*':
+            regex += '[^/]*'
+            i += 1
+        elif pattern[i] == '?':
+            regex += '[^/]'
+            i += 1
+        elif pattern[i] == '[' and ']' in pattern[i + 2:]:
+            end = pattern.index(']', i + 2)
+            chars = pattern[i + 1:end]
+            regex += '[' + ('^' + chars[1:] if chars.startswith('!') else chars).replace('\\', '\\\\') + ']'
+            i = end + 1
+        else:
+            if pattern[i] == '\\' and i + 1 < len(pattern):
+                i += 1
+            regex += re.escape(pattern[i])
+            i += 1
+    return regex
+
+#Function to read the rules of the .gitignore of a directory as (regex, negate, dir_only, anchored)
+#The anchored rules match the path relative to the walk root, the others the name
+def read_gitignore(dirpath, rel):
+    rules = []
+    try:
+        with open(os.path.join(dirpath, '.gitignore')) as fp:
+            lines = fp.read().splitlines()
+    except (IOError, OSError):
+        return rules
+    for line in lines:
+        line = line.rstrip()
+        if not line or line.startswith('#'):
+            continue
+        negate = line.startswith('!')
+        if negate:
+            line = line[1:]
+        elif line.startswith('\\#') or line.startswith('\\!'):
+            line = line[1:]
+        dir_only = line.endswith('/')
+        line = line.rstrip('/')
+        anchored = '/' in line
+        if not line:
+            continue
+        regex = gitignore_regex(line.lstrip('/'))
+        if anchored:
+            regex = (re.escape(rel + '/') if rel else '') + regex
+        rules.append((re.compile(regex + '$'), negate, dir_only, anchored))
+    return rules
+
+#Function to check if the last .gitignore rule matching a path ignores it
+def is_ignored(rules, relpath, name, is_dir):
+    ignored = False
+    for regex, negate, dir_only, anchored in rules:
+        if dir_only and not is_dir:
+            continue
+        if regex.match(relpath if anchored else name):
+            ignored = not negate
+    return ignored
+
+#Class to walk the files to search, the directories are pruned as they are listed and the
+#types come from the directory entries, so a file is only stat for max_size
+class Walker(object):
+    def __init__(self, include=None, exclude=None, max_size=None, max_depth=None, xdev=False, gitignore=False):
+        self.include = include or []
+        self.exclude = exclude or []
+        self.max_size = max_size
+        self.max_depth = max_depth
+        self.xdev = xdev
+        self.gitignore = gitignore
+
+    #Method to check if a name matches one of the globs
+    def matches(self, name, globs):
+        for glob in globs:
+            if fnmatch.fnmatch(name, glob):
+                return True
+        return False
+
+    #Method to yield the (absolute path, entry) of the files of path to search, in the os.walk order
+    #or with ordered sorted by path, each directory is sorted as it is listed and a subdirectory
+    #is walked at its place among the files
+    def files(self, path, ordered=False):
+        root = os.path.abspath(path)
+        root_dev = os.stat(root).st_dev if self.xdev else None
+        #The iterators of the (key, path, relpath, depth, rules, entry) of the listed directories,
+        #entry is None for a directory
+        stack = [iter([(None, root, '', 0, [], None)])]
+        while stack:
+            item = next(stack[-1], None)
+            if item is None:
+                stack.pop()
+                continue
+            key, dirpath, rel, depth, rules, entry = item
+            if entry is not None:
+                yield dirpath, entry
+                continue
+            if self.gitignore:
+                rules = rules + read_gitignore(dirpath, rel)
+            try:
+                entries = list_dir(dirpath)
+            except OSError:
+                continue
+            files = []
+            subdirs = []
+            for entry in entries:
+                name = entry.name
+                if self.exclude and self.matches(name, self.exclude):
+                    continue
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                except OSError:
+                    continue
+                relpath = rel + '/' + name if rel else name
+                if self.gitignore and ((is_dir and name == '.git') or is_ignored(rules, relpath, name, is_dir)):
+                    continue
+                try:
+                    if is_dir:
+                        if self.max_depth is not None and depth >= self.max_depth:
+                            continue
+                        if self.xdev and entry.stat(follow_symlinks=False).st_dev != root_dev:
+                            continue
+                        #The files of a directory sort after a name it is a prefix of
+                        subdirs.append((name + '/', entry.path, relpath, depth + 1, rules, None))
+                        continue
+                    #Like os.path.isfile, a symlink to a regular file is searched
+                    if not entry.is_file():
+                        continue
+                    if self.include and not self.matches(name, self.include):
+                        continue
+                    if self.max_size is not None and entry.stat().st_size > self.max_size:
+                        continue
+                except OSError:
+                    continue
+                files.append((name, entry.path, None, None, None, entry))
+            children = files + subdirs
+            if ordered:
+                children.sort(key=lambda child: child[0])
+            stack.append(iter(children))
+
+#Class to find all the patterns of a large set in one pass over a line
+class AhoCorasick(object):
+    def __init__(self, patterns):
+        #The trie of the patterns, a dict of char to node per node
+        self.goto = [{}]
+        #The indexes of the patterns ending at each node
+        self.out = [[]]
+        for index, pattern in enumerate(patterns):
+            node = 0
+            for char in pattern:
+                child = self.goto[node].get(char)
+                if child is None:
+                    child = len(self.goto)
+                    self.goto[node][char] = child
+                    self.goto.append({})
+                    self.out.append([])
+                node = child
+            self.out[node].append(index)
+        #The failure links, breadth first so the link of the parent is known
+        self.fail = [0] * len(self.goto)
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self.goto[node].items():
+                queue.append(child)
+                link = self.fail[node]
+                while link and char not in self.goto[link]:
+                    link = self.fail[link]
+                self.fail[child] = self.goto[link].get(char, 0)
+                self.out[child] = self.out[child] + self.out[self.fail[child]]
+
+    #Method to return the indexes of the patterns found in the text
+    def search(self, text):
+        goto = self.goto
+        fail = self.fail
+        out = self.out
+        found = set()
+        node = 0
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if out[node]:
+                found.update(out[node])
+        return found
+
+    #Method to yield the (end offset, index) of every occurrence of the patterns in the data
+    def finditer(self, data):
+        goto = self.goto
+        fail = self.fail
+        out = self.out
+        node = 0
+        for pos, char in enumerate(data):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for index in out[node]:
+                yield pos + 1, index
+
+#Class to find all the patterns of a small set, a C level substring search per pattern beats the automaton there
+class SubstringMatcher(object):
+    def __init__(self, patterns):
+        self.patterns = list(enumerate(patterns))
+
+    #Method to return the indexes of the patterns found in the text
+    def search(self, text):
+        return set(index for index, pattern in self.patterns if pattern in text)
+
+    #Method to yield the (end offset, index) of every occurrence of the patterns in the data
+    def finditer(self, data):
+        for index, pattern in self.patterns:
+            pos = data.find(pattern)
+            while pos != -1:
+                yield pos + len(pattern), index
+                pos = data.find(pattern, pos + 1)
+
+#Function to build the matcher of all the patterns
+def build_matcher(patterns):
+    if len(patterns) <= SUBSTRING_MAX_PATTERNS:
+        return SubstringMatcher(patterns)
+    return AhoCorasick(patterns)
+
+#Function to format an identified item
+def format_item(pattern, file, num):
+    return pattern+" - "+file+":"+str(num)
+
+#Function to format a hit as a JSON Lines record, with the text of its line and of the lines
+#around it when it has a context
+def format_json(pattern, file, num, offset, context=None):
+    record = {'pattern': pattern, 'path': file, 'line': num, 'offset': offset}
+    if context is not None:
+        record['before'] = [text for line, text, hit in context if line < num]
+        record['text'] = [text for line, text, hit in context if line == num][0]
+        record['after'] = [text for line, text, hit in context if line > num]
+    return json.dumps(record, sort_keys=True)
+
+#Function to format the lines of a context which are not printed yet the way grep does, the hit
+#lines with ':' and the other ones with '-', and '--' between the groups of lines
+#printed is the (file, line) of the last line printed, the new one is returned with the lines
+def format_context(file, context, printed):
+    lines = []
+    for num, text, hit in context:
+        if printed is not None and printed[0] == file and num <= printed[1]:
+            continue
+        if not lines and printed is not None and (printed[0] != file or num > printed[1] + 1):
+            lines.append("--")
+        separator = ":" if hit else "-"
+        lines.append(file + separator + str(num) + separator + text)
+    if lines:
+        printed = (file, context[-1][0])
+    return lines, printed
+
+#Function to get the byte length of a text line read without newline translation, with the line translated
+def translate_line(line):
+    if TEXT_ENCODING is None:
+        return len(line), line
+    size = len(line.encode(TEXT_ENCODING))
+    if line.endswith('\r\n'):
+        line = line[:-2] + '\n'
+    elif line.endswith('\r'):
+        line = line[:-1] + '\n'
+    return size, line
+
+#Function to check for a NUL byte in the first block of a file, like grep does
+def is_binary(file):
+    with open(file,'rb') as file_content:
+        return b'\0' in file_content.read(BINARY_SNIFF_BYTES)
+
+#Function to split a search spec line into its kind and its text
+def parse_spec(spec):
+    for kind in SPEC_KINDS:
+        if spec.startswith(kind + ':'):
+            return kind, spec[len(kind) + 1:]
+    return 'literal', spec
+
+#Function to compile the regex of a re: or word: search spec
+def compile_spec(kind, text, byte_mode):
+    if kind == 'word':
+        text = r'\b' + re.escape(text) + r'\b'
+    if byte_mode:
+        #The byte mode runs the regexes on a line of the data, ^ only matches there after its newline
+        return re.compile(text.encode('utf-8'), re.MULTILINE)
+    return re.compile(text)
+
+#Function to add the (start, index) of the first match of a regex in the line of data
+#between line_start and line_end to hits. The line ends with its newline like the lines of the
+#text mode, an empty match after that newline is at the start of the next line
+def search_line(regex, index, data, line_start, line_end, hits):
+    match = regex.search(data, line_start, line_end)
+    if match is not None and (match.start() < line_end or data[line_end - 1:line_end] != b'\n'):
+        hits.append((match.start(), index))
+
+#Function to find the longest literal every match of a regex contains, None when there is none
+#or the regex ignores the case. The parse tree is followed through the groups and the repeats
+#of at least one, any other part which matches chars ends the current literal
+def required_literal(regex):
+    parsed = sre_parse.parse(regex)
+    state = getattr(parsed, 'state', None) or parsed.pattern
+    if state.flags & re.IGNORECASE:
+        return None
+    best = ''
+    run = []
+    stack = [iter(parsed)]
+    while stack:
+        item = next(stack[-1], None)
+        if item is None:
+            stack.pop()
+            continue
+        op, av = item
+        if op == sre_parse.LITERAL:
+            run.append(chr(av))
+            if len(run) > len(best):
+                best = ''.join(run)
+        elif op == sre_parse.SUBPATTERN and not (len(av) == 4 and av[1] & re.IGNORECASE):
+            #A group is contiguous with its surroundings
+            stack.append(iter(av[-1]))
+        elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) and av[0] >= 1:
+            #The first repetition is required, its literal cannot join the ones around it
+            run = []
+            stack.append(iter(list(av[2]) + [(None, None)]))
+        elif op != sre_parse.AT:
+            run = []
+    return best or None
+
+#Class to capture the identified lines of the files for the search specs
+#The literals and the required literals of the regexes are all searched by one matcher,
+#a regex only runs on the lines where its literal is found
+#With offsets the text mode counts the byte offset of the hits, the byte mode always counts them
+#The text mode keeps the before lines and the after lines of the hits as their context
+class Scanner(object):
+    def __init__(self, patterns, byte_mode=False, skip_binary=False, offsets=False, before=0, after=0):
+        self.patterns = patterns
+        self.byte_mode = byte_mode
+        self.skip_binary = skip_binary
+        self.offsets = offsets
+        self.before = before
+        self.after = after
+        #The (string, regex) finding the first match of each spec in a line, for the offsets
+        self.finders = []
+        #The strings of the matcher and the (index, regex) of the specs each of them triggers,
+        #regex is None for a literal spec
+        strings = []
+        self.actions = []
+        positions = {}
+        #The (index, regex) of the regexes without a required literal, run on every line
+        self.always = []
+        for index, pattern in enumerate(patterns):
+            kind, text = parse_spec(pattern)
+            regex = None
+            if kind != 'literal':
+                regex = compile_spec(kind, text, byte_mode)
+                text = text if kind == 'word' else required_literal(text)
+            self.finders.append((text, regex))
+            if text is None:
+                self.always.append((index, regex))
+                continue
+            if byte_mode:
+                text = text.encode('utf-8')
+            if text not in positions:
+                positions[text] = len(strings)
+                strings.append(text)
+                self.actions.append([])
+            self.actions[positions[text]].append((index, regex))
+        self.lengths = [len(string) for string in strings]
+        #A literal ending in a chunk starts at most this many bytes before it
+        self.overlap = max(self.lengths or [1]) - 1
+        #The length of the last line of a chunk kept for the regexes
+        has_regex = self.always or any(regex is not None for actions in self.actions for index, regex in actions)
+        self.regex_overlap = REGEX_OVERLAP if has_regex else 0
+        self.matcher = build_matcher(strings)
+
+    #Method to yield the identified items of a file
+    def scan(self, file):
+        return (format_item(pattern, file, num) for num, pattern, offset, context in self.hits(file))
+
+    #Method to yield the (line, pattern, offset, context) of the patterns found in a file,
+    #the offset is None when it is not counted and the context without context lines
+    def hits(self, file):
+        if self.skip_binary and is_binary(file):
+            return iter(())
+        lines = self.scan_bytes(file) if self.byte_mode else self.scan_text(file)
+        return ((num, self.patterns[index], offset, context) for num, index, offset, context in lines)
+
+    #Method to get the byte offset of the first match of a spec in a text line starting at start
+    def line_offset(self, index, line, start):
+        text, regex = self.finders[index]
+        column = line.find(text) if regex is None else regex.search(line).start()
+        if TEXT_ENCODING is None:
+            return start + column
+        return start + len(line[:column].encode(TEXT_ENCODING))
+
+    #Method to yield the (line, index, offset, context) of the patterns found in a text file
+    #With before or after the context of a hit is the list of the (line, text, hit) of the lines
+    #around it, the last lines are kept by a ring buffer and a hit waits for its after lines
+    def scan_text(self, file):
+        actions = self.actions
+        always = self.always
+        offsets = self.offsets
+        offset = None
+        end = 0
+        context = self.before or self.after
+        before = deque(maxlen=self.before)
+        #The (line, context, [(index, offset)]) of the hit lines waiting for their after lines
+        waiting = deque()
+        #The offsets are counted on the lines before the newline translation
+        newline = {'newline': ''} if offsets and TEXT_ENCODING is not None else {}
+        with open(file,'r',**newline) as file_content:
+            for num,line in enumerate(file_content,1):
+                if offsets:
+                    start = end
+                    size, line = translate_line(line)
+                    end += size
+                found = set()
+                for position in self.matcher.search(line):
+                    for index, regex in actions[position]:
+                        if regex is None or (index not in found and regex.search(line)):
+                            found.add(index)
+                for index, regex in always:
+                    if regex.search(line):
+                        found.add(index)
+                if not context:
+                    for index in sorted(found):
+                        if offsets:
+                            offset = self.line_offset(index, line, start)
+                        yield num, index, offset, None
+                    continue
+                entry = (num, line.rstrip('\n'), bool(found))
+                for hit_num, lines, line_hits in waiting:
+                    lines.append(entry)
+                if found:
+                    line_hits = [(index, self.line_offset(index, line, start) if offsets else None)
+                                 for index in sorted(found)]
+                    waiting.append((num, list(before) + [entry], line_hits))
+                before.append(entry)
+                while waiting and waiting[0][0] + self.after <= num:
+                    hit_num, lines, line_hits = waiting.popleft()
+                    for index, offset in line_hits:
+                        yield hit_num, index, offset, lines
+        for hit_num, lines, line_hits in waiting:
+            for index, offset in line_hits:
+                yield hit_num, index, offset, lines
+
+    #Method to get the sorted (start, index) of the literals found in data which end after skip
+    #and of the regexes found in the lines of data between regex_from and regex_to
+    #A regex is run on each line on its own, only on the lines where its literal starts
+    def find_bytes(self, data, skip, regex_from, regex_to):
+        hits = []
+        #The sorted starts of the literals of the regexes in the lines they run on
+        starts = {}
+        for end, position in self.matcher.finditer(data):
+            for index, regex in self.actions[position]:
+                if regex is None:
+                    if end > skip:
+                        hits.append((end - self.lengths[position], index))
+                elif regex_from <= end - self.lengths[position] < regex_to:
+                    starts.setdefault(index, []).append(end - self.lengths[position])
+        for index, regex in self.always:
+            line_start = regex_from
+            while line_start < regex_to:
+                line_end = data.find(b'\n', line_start, regex_to) + 1 or regex_to
+                search_line(regex, index, data, line_start, line_end, hits)
+                line_start = line_end
+        for index, found in starts.items():
+            regex = self.finders[index][1]
+            line_end = regex_from
+            for start in found:
+                if start < line_end:
+                    continue
+                line_start = data.rfind(b'\n', line_end, start) + 1 or line_end
+                line_end = data.find(b'\n', start, regex_to) + 1 or regex_to
+                search_line(regex, index, data, line_start, line_end, hits)
+        hits.sort()
+        return hits
+
+    #Method to yield the (line, index, offset, context) of the patterns found in the bytes of a file,
+    #the context lines are only kept by the text mode
+    #The file is read by chunks, the last bytes of a chunk are searched again with the next one
+    #so the memory does not depend on the length of the lines. The regexes are run once over
+    #every complete line, the lines longer than REGEX_OVERLAP are cut. The newlines are only
+    #counted up to the hits and the end of the chunks
+    def scan_bytes(self, file):
+        carry = b''
+        #The start of the lines of the data the regexes have not been run on
+        regex_from = 0
+        #The offset of the data in the file
+        base = 0
+        #The line number at the offset counted of the data
+        line = 1
+        counted = 0
+        #The first offset of the patterns found on the last line, which may go on in the next chunk
+        pending_line = None
+        pending = {}
+        with open(file,'rb') as file_content:
+            while True:
+                chunk = file_content.read(CHUNK_BYTES)
+                data = carry + chunk
+                #The regexes run up to the last newline, or to the end of the file
+                regex_to = data.rfind(b'\n') + 1 if chunk else len(data)
+                for start, index in self.find_bytes(data, len(carry), regex_from, regex_to):
+                    if start >= counted:
+                        line += data.count(b'\n', counted, start)
+                    else:
+                        line -= data.count(b'\n', start, counted)
+                    counted = start
+                    if line != pending_line:
+                        for pending_index in sorted(pending):
+                            yield pending_line, pending_index, pending[pending_index], None
+                        pending_line = line
+                        pending = {}
+                    #A regex run on the line again may match before the literals of the last chunk
+                    if pending.get(index, base + start) >= base + start:
+                        pending[index] = base + start
+                if not chunk:
+                    break
+                #Keep the bytes a literal may span and the last line for the regexes
+                keep_from = len(data) - self.overlap
+                if self.regex_overlap:
+                    keep_from = min(keep_from, max(regex_to, len(data) - self.regex_overlap))
+                keep_from = max(keep_from, 0)
+                if regex_to >= keep_from:
+                    regex_from = regex_to - keep_from
+                elif keep_from > 0:
+                    #The line is cut, the byte kept before it stops ^ from matching there
+                    keep_from -= 1
+                    regex_from = 1
+                carry = data[keep_from:]
+                base += keep_from
+                #Move the offset counted to the start of the next data
+                if keep_from >= counted:
+                    line += data.count(b'\n', counted, keep_from)
+                else:
+                    line -= data.count(b'\n', keep_from, counted)
+                counted = 0
+        for pending_index in sorted(pending):
+            yield pending_line, pending_index, pending[pending_index], None
+
+#Function to get the (dev:inode, size, mtime_ns) signature of a file
+def stat_signature(st):
+    mtime_ns = getattr(st, 'st_mtime_ns', None)
+    if mtime_ns is None:
+        mtime_ns = int(st.st_mtime * 1000000000)
+    return ('%d:%d' % (st.st_dev, st.st_ino), st.st_size, mtime_ns)
+
+#Class of the on disk index of the hits of the files scanned, keyed on their stat signature
+#and on the hash of the pattern set and scan options they were scanned with
+class ScanIndex(object):
+    def __init__(self, index_path, patterns, options):
+        self.patterns = set(patterns)
+        self.options = repr(options)
+        self.patternset = hashlib.sha1(
+            '\n'.join([self.options] + list(patterns)).encode('utf-8')).hexdigest()
+        self.conn = sqlite3.connect(index_path, timeout=60)
+        #The index is a cache, the one of a version without the offsets of the hits is dropped
+        columns = [row[1] for row in self.conn.execute('PRAGMA table_info(hits)')]
+        if columns and 'offset' not in columns:
+            for table in ('files', 'hits', 'patternsets'):
+                self.conn.execute('DROP TABLE IF EXISTS %s' % table)
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS files ('
+            ' path TEXT PRIMARY KEY, inode TEXT NOT NULL, size INTEGER NOT NULL,'
+            ' mtime_ns INTEGER NOT NULL, patternset TEXT NOT NULL, generation INTEGER NOT NULL)')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS hits (path TEXT NOT NULL, line INTEGER NOT NULL, pattern TEXT NOT NULL, offset INTEGER)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS hits_path ON hits (path)')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS patternsets (hash TEXT PRIMARY KEY, options TEXT NOT NULL, patterns TEXT NOT NULL)')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS generation (value INTEGER NOT NULL)')
+        row = self.conn.execute('SELECT MAX(value) FROM generation').fetchone()
+        #Every run is a new generation, the files not seen by a complete run are evicted
+        self.generation = (row[0] or 0) + 1
+        self.conn.execute('DELETE FROM generation')
+        self.conn.execute('INSERT INTO generation VALUES (?)', (self.generation,))
+        self.conn.execute('INSERT OR IGNORE INTO patternsets VALUES (?, ?, ?)',
+                          (self.patternset, self.options, '\n'.join(patterns)))
+        self.patternsets = {}
+        self.pending = {}
+        self.seen = []
+
+    #Method to get the patterns a pattern set lacks, None when it was scanned with other options
+    def added_patterns(self, patternset):
+        if patternset not in self.patternsets:
+            row = self.conn.execute('SELECT options, patterns FROM patternsets WHERE hash = ?',
+                                    (patternset,)).fetchone()
+            if row is None or row[0] != self.options:
+                self.patternsets[patternset] = None
+            else:
+                scanned = set(row[1].split('\n'))
+                self.patternsets[patternset] = sorted(self.patterns - scanned)
+        return self.patternsets[patternset]
+
+    #Method to get the patterns a file has to be scanned for, None for all of them
+    #and an empty list when the hits of the index are up to date
+    def lookup(self, file, st):
+        signature = stat_signature(st)
+        row = self.conn.execute('SELECT inode, size, mtime_ns, patternset FROM files WHERE path = ?',
+                                (file,)).fetchone()
+        if row is None or tuple(row[:3]) != signature:
+            self.pending[file] = (signature, None, False)
+            return None
+        if row[3] == self.patternset:
+            self.pending[file] = (signature, [], True)
+            return []
+        added = self.added_patterns(row[3])
+        self.pending[file] = (signature, added, False)
+        return added
+
+    #Method to merge the hits of a file scanned for the patterns of lookup with the ones
+    #of the index, the index is updated and the sorted (line, pattern, offset, context) hits are returned
+    def update(self, file, hits):
+        signature, scanned, cached = self.pending.pop(file)
+        if cached:
+            self.seen.append((self.generation, file))
+            return self.conn.execute('SELECT line, pattern, offset, NULL FROM hits WHERE path = ? ORDER BY line, pattern',
+                                     (file,)).fetchall()
+        hits = list(hits)
+        if scanned is not None:
+            #The hits of the patterns still searched are kept
+            hits.extend(row for row in self.conn.execute('SELECT line, pattern, offset, NULL FROM hits WHERE path = ?', (file,))
+                        if row[1] in self.patterns)
+            hits.sort()
+        self.conn.execute('DELETE FROM hits WHERE path = ?', (file,))
+        self.conn.executemany('INSERT INTO hits VALUES (?, ?, ?, ?)',
+                              ((file, num, pattern, offset) for num, pattern, offset, context in hits))
+        self.conn.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)',
+                          (file,) + signature + (self.patternset, self.generation))
+        return hits
+
+    #Method to save the index, the files of root not seen are evicted when root is given
+    def close(self, root=None):
+        self.conn.executemany('UPDATE files SET generation = ? WHERE path = ?', self.seen)
+        if root is not None:
+            prefix = os.path.join(root, '')
+            #The paths starting with the prefix, the char after the separator bounds the range
+            bounds = (prefix, prefix[:-1] + chr(ord(os.sep) + 1), self.generation)
+            self.conn.execute('DELETE FROM hits WHERE path IN (SELECT path FROM files'
+                              ' WHERE path >= ? AND path < ? AND generation < ?)', bounds)
+            self.conn.execute('DELETE FROM files WHERE path >= ? AND path < ? AND generation < ?', bounds)
+            self.conn.execute('DELETE FROM patternsets WHERE hash != ? AND hash NOT IN'
+                              ' (SELECT DISTINCT patternset FROM files)', (self.patternset,))
+        self.conn.commit()
+        self.conn.close()
+
+#Function to get the scanner of some patterns, the scanners are kept in scanners
+def get_scanner(scanners, patterns, options):
+    key = tuple(patterns)
+    if key not in scanners:
+        scanners[key] = Scanner(patterns, *options)
+    return scanners[key]
+
+#Function to capture the (line, pattern, offset, context) hits of a file for the patterns of the scan index,
+#None for all the patterns of the scanner. The scan stops after limit hits
+def scan_hits(scanner, scanners, file, patterns, options, limit=None):
+    if patterns is None:
+        return list(islice(scanner.hits(file), limit))
+    if not patterns:
+        return []
+    return list(islice(get_scanner(scanners, patterns, options).hits(file), limit))
+
+#Function to yield the regular files of the path sorted by path as they are walked, with their stat
+def get_statFiles(path, walker):
+    for file, entry in walker.files(path, True):
+        try:
+            st = entry.stat()
+        except OSError:
+            continue
+        yield file, st
+
+#Function to cut the sorted files into consecutive batches of BATCH_BYTES or BATCH_FILES as they come
+def get_batches(files):
+    batch = []
+    batch_size = 0
+    for file, st in files:
+        batch.append((file, st))
+        batch_size += st.st_size
+        if batch_size >= BATCH_BYTES or len(batch) >= BATCH_FILES:
+            yield batch
+            batch = []
+            batch_size = 0
+    if batch:
+        yield batch
+
+#The scanners of a scan process, built once per process
+worker_scanner = None
+worker_scanners = {}
+worker_options = None
+worker_limit = None
+
+#Function to build the scanner of a scan process
+def init_worker(patterns, options, limit):
+    global worker_scanner, worker_options, worker_limit
+    worker_options = options
+    worker_limit = limit
+    worker_scanner = get_scanner(worker_scanners, patterns, options)
+
+#Function to capture the (file, hits) of a batch of (file, patterns) in a scan process
+def scan_batch(batch):
+    return [(file, scan_hits(worker_scanner, worker_scanners, file, patterns, worker_options, worker_limit))
+            for file, patterns in batch]
+
+#Function to capture the (pattern, file, line, offset, context) hits of the files for the search strings,
+#every file is read once and the hits are streamed as they are found
+#With more than 1 job the batches are scanned by a process pool and their results are
+#streamed back in the order of the batches, so sorted by path and line
+#With an index_path the files unchanged since the last run are only scanned for the patterns
+#added since then, their other hits come from the index
+#With offsets the text mode counts the byte offset of the hits, else it is None
+#The scan of a file stops after file_limit hits and the whole scan after max_hits hits
+#The text mode gives the before and after lines of a hit as its context, else it is None
+def find_hits(path,pass_pattern,jobs=1,byte_mode=False,skip_binary=False,index_path=None,walker=None,
+              offsets=False,file_limit=None,max_hits=None,before=0,after=0):
+    patterns = sorted(pass_pattern)
+    if not patterns or max_hits == 0:
+        return
+    if walker is None:
+        walker = Walker()
+    if index_path and (before or after):
+        raise ValueError('the context lines are not kept by the index')
+    options = (byte_mode, skip_binary, offsets and not byte_mode, before, after)
+    index = ScanIndex(index_path, patterns, options) if index_path else None
+    #The index keeps every hit of a file, they are only capped once merged
+    scan_limit = file_limit if index is None else None
+    complete = False
+    results = None
+    found = 0
+    try:
+        if jobs <= 1:
+            results = scan_files(walker.files(path), patterns, options, index)
+        else:
+            batches = get_batches(get_statFiles(path, walker))
+            if index is None:
+                tasks = ([(file, None) for file, st in batch] for batch in batches)
+            else:
+                #The index is only used from this thread, scan_pool submits the tasks from it
+                tasks = ([(file, index.lookup(file, st)) for file, st in batch] for batch in batches)
+            results = scan_pool(tasks, jobs, patterns, options, scan_limit)
+        for file, hits in results:
+            if index is not None:
+                hits = index.update(file, hits)
+            for num, pattern, offset, context in islice(hits, file_limit):
+                yield pattern, file, num, offset, context
+                found += 1
+                if found == max_hits:
+                    return
+        complete = True
+    finally:
+        if results is not None:
+            results.close()
+        if index is not None:
+            index.close(os.path.abspath(path) if complete else None)
+
+#Function to capture the identified items of the files for the search strings
+def find_string(path,pass_pattern,jobs=1,byte_mode=False,skip_binary=False,index_path=None,walker=None):
+    hits = find_hits(path,pass_pattern,jobs,byte_mode,skip_binary,index_path,walker)
+    return (format_item(pattern, file, num) for pattern, file, num, offset, context in hits)
+
+#Function to capture the (file, hits) of the files scanned by this process, without an index
+#the hits are read as they are found, so the scan of a file stops when they are not read
+def scan_files(files, patterns, options, index):
+    scanners = {}
+    scanner = get_scanner(scanners, patterns, options)
+    for file, entry in files:
+        if index is None:
+            yield file, scanner.hits(file)
+            continue
+        try:
+            st = entry.stat()
+        except OSError:
+            continue
+        yield file, scan_hits(scanner, scanners, file, index.lookup(file, st), options)
+
+#Function to capture the (file, hits) of the tasks scanned by a process pool, in their order
+#The tasks are submitted from this thread as they are walked, with at most BATCHES_PER_JOB
+#per job in flight, and the results are yielded as soon as the ones before them are
+def scan_pool(tasks, jobs, patterns, options, limit):
+    pool = Pool(jobs, initializer=init_worker, initargs=(patterns, options, limit))
+    pending = deque()
+    try:
+        for task in tasks:
+            pending.append(pool.apply_async(scan_batch, (task,)))
+            while pending and (pending[0].ready() or len(pending) >= jobs * BATCHES_PER_JOB):
+                for file, hits in pending.popleft().get():
+                    yield file, hits
+        while pending:
+            for file, hits in pending.popleft().get():
+                yield file, hits
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
 
 #Main Function to print the files with the total identified items
 def main():
-    output_list = list(find_string(path,pass_pattern))
-    for item in output_list:
-        print item
-    print "Total number of items found: %s" % len(output_list)
+    args = parser.parse_args()
+    #Getting the path and input file as user input recommended to input absolute paths
+    path = args.dir
+    try:
+        pass_pattern = read_patterns(args.input_file)
+    except ValueError as e:
+        parser.error(str(e))
+    before = args.context if args.before_context is None else args.before_context
+    after = args.context if args.after_context is None else args.after_context
+    if args.files_with_matches:
+        before = after = 0
+    if (before or after) and args.bytes:
+        parser.error('the context lines need the text mode, without -b')
+    if (before or after) and args.index:
+        parser.error('the context lines are not kept by the index, without -x')
+    #The items are printed as they are found, a file is searched up to its first hit for its path
+    found = 0
+    printed = None
+    jsonl = args.format == 'jsonl'
+    file_limit = 1 if args.files_with_matches else args.max_hits_per_file
+    walker = Walker(args.include, args.exclude, args.max_size, args.max_depth, args.xdev, args.gitignore)
+    for pattern, file, num, offset, context in find_hits(path,pass_pattern,args.jobs,args.bytes,args.skip_binary,
+                                                         args.index,walker,jsonl or args.byte_offset,file_limit,
+                                                         args.max_hits,before,after):
+        if args.files_with_matches:
+            print(json.dumps({'path': file}) if jsonl else file)
+        elif jsonl:
+            print(format_json(pattern, file, num, offset, context))
+        else:
+            print(format_item(pattern, file, num) + (":"+str(offset) if args.byte_offset else ""))
+            if context is not None:
+                lines, printed = format_context(file, context, printed)
+                for line in lines:
+                    print(line)
+        found += 1
+    #The JSON Lines output only holds the records
+    if not jsonl:
+        print("Total number of items found: %s" % found)
 
 #Execution Starts Here
 if __name__ == '__main__':
     main()
-
-         
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+from __future__ import print_function
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+import find_text
+
+"""
+Description:
+  - Benchmark the multi-pattern search of find_text against the one pass per pattern scan it replaced
+  - A synthetic tree of text files is generated in a temporary directory, the patterns are random tokens
+  - The pattern count scales from 10 to 100k, every engine is checked to report the same hits as the first one
+  - The legacy scan is only timed up to --legacy_max patterns, it reads every file once per pattern
+  - With --modes the text mode and the byte mode are timed with literal, re: and word: specs, some of the
+    regexes could match across the newlines, both modes are checked to report the same hits and offsets
+Usage:
+  find_text_bench.py [-n <files>] [-l <lines>] [-c <counts>] [--legacy_max <patterns>]
+  find_text_bench.py --modes [-n <files>] [-l <lines>] [-c <counts>]
+Example:
+  find_text_bench.py -n 50 -l 2000 -c 10 100 1000 10000 100000
+  find_text_bench.py --modes -n 20 -l 2000 -c 10 100
+"""
+
+parser = argparse.ArgumentParser(description='Benchmark the find_text multi-pattern search')
+parser.add_argument('-n', '--files', type=int, default=20, help='Number of files in the synthetic tree')
+parser.add_argument('-l', '--lines', type=int, default=2000, help='Number of lines per file')
+parser.add_argument('-c', '--counts', type=int, nargs='+', default=[10, 100, 1000, 10000, 100000], help='Pattern counts to benchmark')
+parser.add_argument('--legacy_max', type=int, default=100, help='Largest pattern count the legacy scan is timed with')
+parser.add_argument('--modes', action='store_true', help='Compare the text mode and the byte mode on regex specs')
+
+ALPHABET = 'abcdefghijklmnopqrstuvwxyz0123456789'
+
+
+def random_token(rng, low, high):
+    return ''.join(rng.choice(ALPHABET) for _ in range(rng.randint(low, high)))
+
+
+def make_tree(dirname, files, lines):
+    '''Create text files of random tokens, 10 tokens per line'''
+    rng = random.Random(files)
+    for i in range(files):
+        with open(os.path.join(dirname, 'f{:04d}.txt'.format(i)), 'w') as fp:
+            for _ in range(lines):
+                fp.write(' '.join(random_token(rng, 3, 12) for _ in range(10)) + '\n')
+
+
+def make_patterns(count):
+    '''Random tokens of 4 to 10 chars, some of them hit the synthetic files'''
+    rng = random.Random(count)
+    return set(random_token(rng, 4, 10) for _ in range(count))
+
+
+def make_specs(count):
+    '''Random literal, re: and word: specs, the regexes with \\s, [^...] and \\W match the
+    newlines if they are run over more than one line'''
+    rng = random.Random(count)
+    specs = set()
+    for i in range(count):
+        token = random_token(rng, 3, 6)
+        kind = i % 6
+        if kind == 0:
+            specs.add(token)
+        elif kind == 1:
+            specs.add('word:' + token)
+        elif kind == 2:
+            specs.add('re:' + token[:2] + r'\s+' + rng.choice(ALPHABET))
+        elif kind == 3:
+            specs.add('re:' + token[:2] + '[^' + rng.choice(ALPHABET) + ']+' + rng.choice(ALPHABET))
+        elif kind == 4:
+            specs.add('re:^' + token[:2])
+        else:
+            specs.add('re:' + token[:2] + r'\W')
+    return specs
+
+
+def bench_modes(path, counts):
+    '''Time the text mode and the byte mode on the same specs'''
+    for count in counts:
+        specs = make_specs(count)
+        expected = None
+        for name, byte_mode in [('text', False), ('bytes', True)]:
+            start = time.time()
+            hits = sorted(find_text.find_hits(path, specs, byte_mode=byte_mode, offsets=True))
+            elapsed = time.time() - start
+            if expected is None:
+                expected = hits
+            status = 'ok' if hits == expected else 'MISMATCH'
+            print('{:>7} specs  {:<13} {:>8.3f}s  {} hits  {}'.format(count, name, elapsed, len(hits), status))
+
+
+def legacy_find_string(path, pass_pattern):
+    '''The scan find_string replaced, one pass over every file per pattern'''
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            file = os.path.abspath(os.path.join(root, name))
+            if not os.path.isfile(file):
+                continue
+            for string in pass_pattern:
+                with open(file, 'r') as file_content:
+                    for num, line in enumerate(file_content, 1):
+                        if string in line:
+                            yield string + " - " + file + ":" + str(num)
+
+
+def engine_find_string(engine):
+    '''find_string with the matcher forced to engine'''
+    def run(path, pass_pattern):
+        build_matcher = find_text.build_matcher
+        find_text.build_matcher = engine
+        try:
+            return list(find_text.find_string(path, pass_pattern))
+        finally:
+            find_text.build_matcher = build_matcher
+    return run
+
+
+def main():
+    args = parser.parse_args()
+    tmpdir = tempfile.mkdtemp(prefix='find_text_bench')
+    try:
+        make_tree(tmpdir, args.files, args.lines)
+        if args.modes:
+            bench_modes(tmpdir, args.counts)
+            return
+        for count in args.counts:
+            patterns = make_patterns(count)
+            runs = [('aho-corasick', engine_find_string(find_text.AhoCorasick))]
+            if count <= find_text.SUBSTRING_MAX_PATTERNS * 10:
+                runs.append(('substring', engine_find_string(find_text.SubstringMatcher)))
+            if count <= args.legacy_max:
+                runs.append(('legacy', lambda path, pass_pattern: list(legacy_find_string(path, pass_pattern))))
+            expected = None
+            for name, run in runs:
+                start = time.time()
+                hits = sorted(run(tmpdir, patterns))
+                elapsed = time.time() - start
+                if expected is None:
+                    expected = hits
+                status = 'ok' if hits == expected else 'MISMATCH'
+                print('{:>7} patterns  {:<13} {:>8.3f}s  {} hits  {}'.format(count, name, elapsed, len(hits), status))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -19,7 +19,9 @@ options:
   path:
     description:
       - The full path of the file/object to get the facts of.
+      - A list of paths returns the checksum of each of them in I(checksums), directories nested in another one are walked once and all the files are hashed on one pool of I(workers)
     required: true
+    type: raw
   follow_links:
     description:
       - Whether to follow symlinks.
@@ -29,18 +31,24 @@ options:
   checksum_type:
     description:
       - Which checksum algorithm to use to apply to the path
-    choices: ['md5', 'sha1', 'sha256', 'sha512']
+      - C(blake2b) and C(blake2s) need Python 3.6 or later
+      - The fastest algorithm depends on the CPU, sha1 and sha256 win on CPUs with SHA extensions, run get_checksum_bench.py --throughput on the target to compare them
+      - C(xxh64), C(xxh3_64) and C(xxh128) are fast non-cryptographic hashes from the python xxhash library, only use them between trusted hosts
+      - When the algorithm is not available on the target it falls back to blake2b, or md5 without blake2, with a warning
+    choices: ['md5', 'sha1', 'sha256', 'sha512', 'blake2b', 'blake2s', 'xxh64', 'xxh3_64', 'xxh128']
     default: 'md5'
     type: str
   exclude_files:
     description: 
       - The files to be excluded in the path for the checksum calculation
+      - Entries with glob characters (*, ? or [) are matched as glob patterns against the file names
       - Only works for directory 
     default: None
     type: list
   ignore_hidden: 
     description: 
       - If hidden files should be included
+      - Hidden directories are not descended
       - Only works for directory
     default: False
     type: bool
@@ -50,6 +58,103 @@ options:
       - Only works for directory
     default: None
     type: list
+  workers:
+    description:
+      - Number of files hashed concurrently
+      - C(1) keeps the serial path, C(0) starts one worker per CPU
+      - Only works for directory
+    default: 1
+    type: int
+  worker_type:
+    description:
+      - The pool used when I(workers) is not C(1)
+      - C(thread) suits I/O bound trees, C(process) suits CPU bound algorithms like sha512
+      - Only works for directory
+    choices: ['thread', 'process']
+    default: 'thread'
+    type: str
+  cache_path:
+    description:
+      - Path of an SQLite digest cache on the target host, created if missing
+      - A file is only read again when its (dev, inode, size, mtime_ns) signature changed since it was cached
+    default: None
+    type: path
+  cache_max_entries:
+    description:
+      - The maximum number of digests kept in I(cache_path)
+      - The least recently used digests are evicted first
+    default: 1000000
+    type: int
+  read_strategy:
+    description:
+      - How the files are read for hashing
+      - C(auto) memory maps files of 16 MiB and more and uses C(readinto) for the others
+      - C(mmap) hashes the page cache directly without copying the data
+      - C(readinto) reads into one reused buffer, C(read) allocates a new buffer per block
+      - The read size grows from 64 KiB to 1 MiB with the size of the file
+      - A file truncated while it is memory mapped kills the module with SIGBUS, use C(readinto) on trees which are written to
+    choices: ['auto', 'mmap', 'readinto', 'read']
+    default: 'auto'
+    type: str
+  fadvise:
+    description:
+      - Hint the kernel that the files are read sequentially, so it reads ahead more aggressively
+      - Ignored where posix_fadvise is not available
+    default: False
+    type: bool
+  mode:
+    description:
+      - How the digests of the files are combined into I(checksum_value)
+      - C(flat) reduces the sorted digests of all the files
+      - C(merkle) gives every directory a digest of its file names and digests and of the digests of its subdirectories, I(checksum_value) is the digest of I(path)
+      - With C(merkle) and I(ignore_hidden) hidden directories are not descended
+      - C(quick) is C(flat) with a cheap digest per file, see I(quick_size)
+      - Only works for directory
+    choices: ['flat', 'merkle', 'quick']
+    default: 'flat'
+    type: str
+  quick_size:
+    description:
+      - In C(quick) mode a file is digested from its size, its mtime, its first and last I(quick_size) KiB and I(quick_samples) blocks of I(quick_size) KiB evenly spaced in between
+      - Files up to (I(quick_samples) + 2) * I(quick_size) KiB are read whole
+      - Meant for pre-flight checks on huge trees, the full hash stays the default
+      - A change outside of the sampled blocks which keeps the size and the mtime is missed, e.g. a file rewritten in place within the mtime resolution, or by a tool which restores the mtime such as C(cp -p), C(rsync -t) or C(touch -r)
+      - A new mtime with the same content reports a change
+    default: 64
+    type: int
+  quick_samples:
+    description:
+      - The number of blocks sampled between the first and last blocks in C(quick) mode
+    default: 8
+    type: int
+  return_manifest:
+    description:
+      - Return the per-directory digests of C(merkle) mode as I(manifest)
+    default: False
+    type: bool
+  prior_manifest:
+    description:
+      - The I(manifest) of a previous C(merkle) run on the same path
+      - The files of a directory whose mtime is unchanged are not hashed again, its files digest is taken from the manifest
+      - The mtime of a directory only changes when entries are added, removed or renamed. A file rewritten in place goes unnoticed, so only use it on trees which are updated by replacing files
+      - Ignored when it was built with another checksum_type, exclude or follow option
+    default: None
+    type: dict
+  manifest_path:
+    description:
+      - Write the per-file manifest of the directory to this path on the target host
+      - One "<digest>  <path relative to I(path)>" line per file sorted by path, like the output of md5sum
+      - Only works for directory in C(flat) mode
+    default: None
+    type: path
+  compare_to:
+    description:
+      - A manifest written by I(manifest_path) to compare the directory against
+      - The files are merge-joined against the manifest while the directory is walked, neither side is held in memory
+      - Can be the same path as I(manifest_path), the manifest is replaced after the comparison
+      - Only works for directory in C(flat) mode
+    default: None
+    type: path
 
 author:
     - Rahul K
@@ -65,18 +170,45 @@ EXAMPLES = '''
 - debug
     msg:  'Checksum_value is {{ checksum.checksum_value }}'
 
+# Generate the Checksum Values of several directories/files in one task
+- get_checksum:
+    path:
+      - path/to/directory
+      - path/to/directory/subdirectory
+      - path/to/file
+    workers: 0
+  register: checksum
+
+- debug
+    msg:  'Checksum_value of the file is {{ checksum.checksums["path/to/file"] }}'
+
 # Generate the Checksum Value with certain checksum_algorithm 
 - get_checksum: 
      path: path/to/directory
      checksum_type: sha1/md5/sha256/sha512
   register: checksum
 
+# Generate a fast non-cryptographic checksum between our own hosts
+- get_checksum:
+     path: path/to/directory
+     checksum_type: xxh3_64
+  register: checksum
+
+# Check if anything obviously changed in a huge directory by sampling its files
+- get_checksum:
+      path: path/to/directory
+      mode: quick
+      quick_size: 128
+      quick_samples: 4
+  register: checksum
+
 # Generate checksum value of directory excluding files
 - get_checksum:
       path: path/to/directory
       exclude_files: 
          - test1
          - test2
+         - '*.tmp'
   register: checksum
 
 # Generate checksum value of directory excluding certain extensions
@@ -98,18 +230,120 @@ EXAMPLES = '''
       path: path/to/directory
       follow_symlinks: yes
   register: checksum
+
+# Hash a large directory with one thread per CPU
+- get_checksum:
+      path: path/to/directory
+      workers: 0
+  register: checksum
+
+# Hash a large directory with 8 worker processes for a CPU bound algorithm
+- get_checksum:
+      path: path/to/directory
+      checksum_type: sha512
+      workers: 8
+      worker_type: process
+  register: checksum
+
+# Only read the files which changed since the previous run
+- get_checksum:
+      path: path/to/directory
+      cache_path: /var/cache/get_checksum.db
+  register: checksum
+
+- debug
+    msg:  'Read {{ checksum.cache_misses }} files, {{ checksum.cache_hits }} answered from cache'
+
+# Build a merkle tree of the directory and only rehash the changed directories on the next run
+- get_checksum:
+      path: path/to/directory
+      mode: merkle
+      return_manifest: yes
+  register: before
+
+- get_checksum:
+      path: path/to/directory
+      mode: merkle
+      return_manifest: yes
+      prior_manifest: '{{ before.manifest }}'
+  register: after
+
+- debug
+    msg:  'The digest of subdir is now {{ after.manifest.directories.subdir.digest }}'
+
+# Report the files which changed since the previous run and save the new manifest
+- get_checksum:
+      path: path/to/directory
+      compare_to: /var/lib/checksums/directory.manifest
+      manifest_path: /var/lib/checksums/directory.manifest
+  register: checksum
+
+- debug
+    msg:  'Modified files: {{ checksum.modified }}'
 '''
 
 RETURN = '''
 checksum_value:
     description: The checksum value generated
     type: str
+checksums:
+    description: The checksum value of every path, when path is a list
+    returned: when path is a list
+    type: dict
+checksum_type:
+    description: The checksum algorithm used, differs from the requested one after a fallback
+    type: str
+cache_hits:
+    description: The number of file digests answered from I(cache_path)
+    returned: when cache_path is set
+    type: int
+cache_misses:
+    description: The number of files which had to be read and hashed
+    returned: when cache_path is set
+    type: int
+manifest:
+    description:
+      - The merkle tree of the directory, directories maps the path of every directory relative to I(path) to its digest, files_digest and mtime_ns
+      - checksum_type and options identify the settings it was built with
+    returned: when mode is merkle and return_manifest is set
+    type: dict
+added:
+    description: The files of the directory which are not in I(compare_to)
+    returned: when compare_to is set
+    type: list
+removed:
+    description: The files of I(compare_to) which are no longer in the directory
+    returned: when compare_to is set
+    type: list
+modified:
+    description: The files whose digest differs from I(compare_to)
+    returned: when compare_to is set
+    type: list
 '''
 
 # Importing the required modules for calculating the checksum
 import os
+import fnmatch
 import hashlib
+import mmap
 import re
+import stat
+import sqlite3
+import time
+from collections import deque
+from multiprocessing import cpu_count
+from multiprocessing.pool import Pool, ThreadPool
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
 
 # Importing the Ansible Module 
 from ansible.module_utils.basic import *
@@ -122,43 +356,597 @@ HASH_FUNCS = {
     'sha512': hashlib.sha512
 }
 
-# Method to perform hashing of a directory with extra options
+# blake2 is part of hashlib from Python 3.6
+for name in ('blake2b', 'blake2s'):
+    if hasattr(hashlib, name):
+        HASH_FUNCS[name] = getattr(hashlib, name)
+
+# Fast non-cryptographic hashes, when the xxhash library is installed
+if xxhash is not None:
+    HASH_FUNCS['xxh64'] = xxhash.xxh64
+    if hasattr(xxhash, 'xxh3_64'):
+        HASH_FUNCS['xxh3_64'] = xxhash.xxh3_64
+        HASH_FUNCS['xxh128'] = xxhash.xxh3_128
+
+# Algorithms which can be asked for, the first available fallback is used
+# for the ones missing on the target
+CHECKSUM_TYPES = ['md5', 'sha1', 'sha256', 'sha512', 'blake2b', 'blake2s',
+                  'xxh64', 'xxh3_64', 'xxh128']
+FALLBACK_TYPES = ['blake2b', 'md5']
+
+# Defining the pools available for parallel hashing
+POOL_TYPES = {
+    'thread': ThreadPool,
+    'process': Pool
+}
+
+# Number of files queued per worker, bounds the memory of the work queue
+QUEUE_DEPTH = 4
+
+# Characters which make an exclude_files entry a glob pattern
+GLOB_CHARS = re.compile(r'[*?[]')
+
+# Files at least this large are memory mapped by the auto read strategy
+MMAP_THRESHOLD = 16 * 1024 * 1024
+
+# Bounds of the read size, which grows with the size of the file
+MIN_BLOCKSIZE = 64 * 1024
+MAX_BLOCKSIZE = 1024 * 1024
+
+# First line of the manifest files, names the checksum algorithm
+MANIFEST_HEADER = '# get_checksum manifest {}\n'
+
+# Escape sequences of the manifest paths flagged with a leading backslash
+MANIFEST_ESCAPES = re.compile(br'\\(.)', re.S)
+
+# Method to perform hashing of a directory with extra options,
+# every (relpath, hashvalue) is added to the manifests in sorted order and
+# hash_options are passed on to _iter_hashes
 def dirhash(dirname, hashfunc, exclude_files, ignore_hidden,
-            followlinks, exclude_extensions):
+            followlinks, exclude_extensions, manifests=(), **hash_options):
     hash_func = HASH_FUNCS.get(hashfunc)
+    excluded = _exclude_matcher(exclude_files, exclude_extensions)
+    files = _walk_files(dirname, excluded, ignore_hidden, followlinks,
+                        sort=bool(manifests))
+    prefix = len(os.path.join(dirname, ''))
     hashvalues = []
-    for root, dirs, files in os.walk(dirname, topdown=True, followlinks=followlinks):
-        if ignore_hidden:
-            if not re.search(r'/\.', root):
-                hashvalues.extend(
-                    [_filehash(os.path.join(root, f),
-                               hash_func) for f in files if not
-                     f.startswith('.') and not re.search(r'/\.', f)
-                     and f not in exclude_files
-                     and f.split('.')[-1:][0] not in exclude_extensions
-                     ]
-                )
-        else:
-            hashvalues.extend(
-                [
-                    _filehash(os.path.join(root, f), hash_func) 
-                    for f in files 
-                    if f not in exclude_files
-                    and f.split('.')[-1:][0] not in exclude_extensions
-                ]
-            )
+    for filepath, hashvalue in _iter_hashes(files, hashfunc, **hash_options):
+        hashvalues.append(hashvalue)
+        for manifest in manifests:
+            manifest.add(_to_bytes(filepath[prefix:]), hashvalue)
     return _reduce_hash(hashvalues, hash_func)
 
+# Method to perform the hashing of several directories and files at once,
+# directories nested in another one are walked once with it and every file
+# is hashed once on the shared pool of hash_options
+def multi_dirhash(paths, hashfunc, exclude_files, ignore_hidden,
+                  followlinks, exclude_extensions, **hash_options):
+    hash_func = HASH_FUNCS.get(hashfunc)
+    excluded = _exclude_matcher(exclude_files, exclude_extensions)
+    roots = set(path for path in paths if os.path.isdir(path))
+    ancestors = set()
+    for root in roots:
+        while root not in ancestors and os.path.dirname(root) != root:
+            ancestors.add(root)
+            root = os.path.dirname(root)
+    hashvalues = dict((path, []) for path in paths)
+    # The paths each queued file counts for, in the order of _iter_hashes
+    owners = deque()
+
+    def files():
+        for path in paths:
+            if path not in roots:
+                owners.append((path,))
+                yield path, None
+        visited = set()
+        # Ancestors sort first, so nested roots are visited with them and
+        # only the ones behind an unfollowed symlink are walked on their own
+        for top in sorted(roots):
+            if top in visited:
+                continue
+            for filepath, entry, counts_for in _walk_roots(top, roots, ancestors, excluded,
+                                                           ignore_hidden, followlinks, visited):
+                owners.append(counts_for)
+                yield filepath, entry
+
+    for filepath, hashvalue in _iter_hashes(files(), hashfunc, **hash_options):
+        for path in owners.popleft():
+            hashvalues[path].append(hashvalue)
+    # Files get their own digest, like a single file path
+    return dict((path, _reduce_hash(hashvalue, hash_func) if path in roots
+                 else hashvalue[0]) for path, hashvalue in hashvalues.items())
+
+# Method to list the (path, DirEntry) of the files below top with the roots
+# they count for, a file counts for every root it is in unless a hidden
+# directory lies in between.
+# Directories which count for no root are only descended to reach one.
+def _walk_roots(top, roots, ancestors, excluded, ignore_hidden, followlinks,
+                visited):
+    stack = [(top, ())]
+    while stack:
+        dirpath, counts_for = stack.pop()
+        if dirpath in roots:
+            visited.add(dirpath)
+            if not (ignore_hidden and re.search(r'/\.', dirpath)):
+                counts_for = counts_for + (dirpath,)
+        try:
+            dirs, files = _list_dir(dirpath, excluded, False, followlinks)
+        except OSError:
+            continue
+        for name, path in dirs:
+            child_counts_for = counts_for
+            if ignore_hidden and name.startswith('.'):
+                child_counts_for = ()
+            if child_counts_for or path in ancestors:
+                stack.append((path, child_counts_for))
+        if counts_for:
+            for name, path, entry in files:
+                if not (ignore_hidden and name.startswith('.')):
+                    yield path, entry, counts_for
+
+# Method to perform a merkle hashing of a directory, every directory gets a
+# digest of its files and of the digests of its subdirectories.
+# Directories whose mtime matches the prior manifest keep their files digest
+# without hashing their files again, the subdirectories are still descended.
+def merkle_dirhash(dirname, hashfunc, exclude_files, ignore_hidden,
+                   followlinks, exclude_extensions, prior_manifest=None,
+                   **hash_options):
+    hash_func = HASH_FUNCS.get(hashfunc)
+    excluded = _exclude_matcher(exclude_files, exclude_extensions)
+    # A prior manifest is only trusted if it was built with the same options
+    options = hash_func(repr([hashfunc, sorted(exclude_files),
+                              sorted(exclude_extensions), ignore_hidden,
+                              followlinks]).encode('utf-8')).hexdigest()
+    prior = {}
+    if prior_manifest and prior_manifest.get('options') == options:
+        prior = prior_manifest.get('directories', {})
+    prefix = len(os.path.join(dirname, ''))
+    directories = {}
+    subdirs = {}
+    filehashes = {}
+
+    def changed_files():
+        stack = [dirname]
+        while stack:
+            root = stack.pop()
+            try:
+                dirs, files = _list_dir(root, excluded, ignore_hidden, followlinks)
+            except OSError:
+                # Unreadable subdirectories are skipped like os.walk does
+                if root is dirname:
+                    raise
+                continue
+            relroot = root[prefix:] or '.'
+            subdirs[relroot] = [name for name, _ in dirs]
+            stack.extend(path for _, path in dirs)
+            entry = directories[relroot] = {'mtime_ns': _stat_signature(os.stat(root))[3]}
+            prior_entry = prior.get(relroot, {})
+            if prior_entry.get('mtime_ns') == entry['mtime_ns'] and 'files_digest' in prior_entry:
+                entry['files_digest'] = prior_entry['files_digest']
+                continue
+            filehashes[relroot] = []
+            for _, filepath, entry in files:
+                yield filepath, entry
+
+    for filepath, hashvalue in _iter_hashes(changed_files(), hashfunc, **hash_options):
+        relroot, _, name = filepath[prefix:].rpartition(os.sep)
+        filehashes[relroot or '.'].append(
+            _to_bytes(name) + b'\0' + hashvalue.encode('utf-8'))
+
+    # Reduce the deepest directories first so the subdirectory digests are known
+    for relroot in sorted(directories, key=_merkle_depth, reverse=True):
+        entry = directories[relroot]
+        if 'files_digest' not in entry:
+            entry['files_digest'] = _reduce_entries(filehashes.pop(relroot), hash_func)
+        children = []
+        for d in subdirs[relroot]:
+            child = directories.get(os.path.normpath(os.path.join(relroot, d)))
+            # Skip the unreadable subdirectories
+            if child is not None:
+                children.append(_to_bytes(d) + b'\0' + child['digest'].encode('utf-8'))
+        entry['digest'] = _reduce_entries(
+            children + [b'\0' + entry['files_digest'].encode('utf-8')], hash_func)
+    manifest = {'checksum_type': hashfunc, 'options': options,
+                'directories': directories}
+    return directories['.']['digest'], manifest
+
+# Method to sort the directories of a merkle manifest, the root is the shallowest
+def _merkle_depth(relroot):
+    if relroot == '.':
+        return -1
+    return relroot.count(os.sep)
+
+# Method to reduce the sorted (name, digest) entries of a directory
+def _reduce_entries(entries, hashfunc):
+    hasher = hashfunc()
+    for entry in sorted(entries):
+        hasher.update(entry + b'\n')
+    return hasher.hexdigest()
+
+# Method to get the bytes of a file name, undecodable names round trip
+def _to_bytes(name):
+    if isinstance(name, bytes):
+        return name
+    return name.encode('utf-8', 'surrogateescape')
+
+# Method to build the check of the excluded file names once, literal names and
+# extensions are looked up in sets and glob patterns are compiled into one regex
+def _exclude_matcher(exclude_files, exclude_extensions):
+    names = set()
+    patterns = []
+    for pattern in exclude_files:
+        if GLOB_CHARS.search(pattern):
+            patterns.append(fnmatch.translate(pattern))
+        else:
+            names.add(pattern)
+    extensions = set(exclude_extensions)
+    glob_match = re.compile('|'.join(patterns)).match if patterns else None
+
+    def excluded(name):
+        return (name in names
+                or name.rpartition('.')[2] in extensions
+                or (glob_match is not None and glob_match(name) is not None))
+    return excluded
+
+# Method to list the (name, path) of the subdirectories to descend and the
+# (name, path, DirEntry) of the files which take part in the checksum, the
+# entry types come from scandir so no stat is needed and the DirEntry keeps
+# the stat of a file once the digest cache asked for it
+def _list_dir(dirpath, excluded, ignore_hidden, followlinks):
+    dirs = []
+    files = []
+    for entry in _scandir(dirpath):
+        name = entry.name
+        if ignore_hidden and name.startswith('.'):
+            continue
+        try:
+            is_dir = entry.is_dir()
+        except OSError:
+            is_dir = False
+        if is_dir:
+            # Symlinked directories are not followed unless asked for
+            if followlinks or not entry.is_symlink():
+                dirs.append((name, entry.path))
+        elif not excluded(name):
+            files.append((name, entry.path, entry))
+    return dirs, files
+
+# Method to list the (path, DirEntry) of the files of a directory which take
+# part in the checksum, with sort the files come in the order of their paths.
+# The entries of a directory are then sorted with a trailing '/' on the subdirectories, so the
+# files of a subdirectory come where its relative path sorts.
+def _walk_files(dirname, excluded, ignore_hidden, followlinks, sort=False):
+    if ignore_hidden and re.search(r'/\.', dirname):
+        return
+    stack = [(dirname, None)]
+    while stack:
+        path, entry = stack.pop()
+        if entry is not None:
+            yield path, entry
+            continue
+        try:
+            dirs, files = _list_dir(path, excluded, ignore_hidden, followlinks)
+        except OSError:
+            continue
+        if sort:
+            entries = [(_to_bytes(d) + b'/', dirpath, None) for d, dirpath in dirs]
+            entries.extend((_to_bytes(f), filepath, entry) for f, filepath, entry in files)
+            # Push the sorted entries in reverse so they pop in order
+            entries.sort(key=lambda item: item[0], reverse=True)
+            stack.extend((entry_path, entry) for _, entry_path, entry in entries)
+        else:
+            stack.extend((dirpath, None) for _, dirpath in dirs)
+            for _, filepath, entry in files:
+                yield filepath, entry
+
+# Method to iterate over the entries of a directory, falls back to listdir
+# on Pythons without scandir
+def _scandir(dirpath):
+    if scandir is not None:
+        return scandir(dirpath)
+    return [_DirEntry(dirpath, name) for name in os.listdir(dirpath)]
+
+class _DirEntry(object):
+    '''The part of os.DirEntry used by _list_dir and DigestCache, for Pythons
+    without scandir'''
+
+    def __init__(self, dirpath, name):
+        self.name = name
+        self.path = os.path.join(dirpath, name)
+
+    def is_dir(self):
+        return os.path.isdir(self.path)
+
+    def is_symlink(self):
+        return os.path.islink(self.path)
+
+    def stat(self):
+        return os.stat(self.path)
+
+# Method to yield the (filepath, hashvalue) of the (filepath, DirEntry) files
+# in the order given, answering from the digest cache when possible. The
+# DirEntry is None for the files which do not come from a walk
+def _iter_hashes(files, hashfunc, workers=1, worker_type='thread', cache=None,
+                 read_strategy='auto', fadvise=False, quick=None):
+    if cache is None:
+        items = ((filepath, None) for filepath, entry in files)
+    else:
+        items = cache.lookup(files)
+    for filepath, hashvalue in _iter_filehash(items, hashfunc, workers,
+                                              worker_type, read_strategy,
+                                              fadvise, quick):
+        if cache is not None:
+            cache.store(filepath, hashvalue)
+        yield filepath, hashvalue
+
+# Method to hash the (filepath, None) items, items which already carry
+# their hashvalue are passed through in order
+def _iter_filehash(items, hashfunc, workers, worker_type,
+                   read_strategy='auto', fadvise=False, quick=None):
+    if workers == 1:
+        for filepath, hashvalue in items:
+            if hashvalue is None:
+                hashvalue = _filehash_worker(
+                    (filepath, hashfunc, read_strategy, fadvise, quick))
+            yield filepath, hashvalue
+        return
+    # Hash files on a pool of workers fed from a bounded work queue
+    workers = workers or cpu_count()
+    pool = POOL_TYPES.get(worker_type)(workers)
+    pending = deque()
+    try:
+        for filepath, hashvalue in items:
+            if hashvalue is None:
+                hashvalue = pool.apply_async(
+                    _filehash_worker,
+                    ((filepath, hashfunc, read_strategy, fadvise, quick),))
+            pending.append((filepath, hashvalue))
+            if len(pending) >= workers * QUEUE_DEPTH:
+                yield _resolve(pending.popleft())
+        while pending:
+            yield _resolve(pending.popleft())
+    finally:
+        pool.terminate()
+        pool.join()
+
+# Method to wait for the hashvalue of a queued item
+def _resolve(item):
+    filepath, hashvalue = item
+    if hasattr(hashvalue, 'get'):
+        hashvalue = hashvalue.get()
+    return filepath, hashvalue
+
+# Method hashing one file, run by the pool workers too so it takes the
+# algorithm name which can be pickled. quick is the (sample_size, samples)
+# of the quick mode, None hashes the whole file.
+def _filehash_worker(args):
+    filepath, hashfunc, read_strategy, fadvise, quick = args
+    if quick is not None:
+        return _quickhash(filepath, HASH_FUNCS.get(hashfunc), *quick)
+    return _filehash(filepath, HASH_FUNCS.get(hashfunc), read_strategy, fadvise)
+
+# Method to get the stat signature of a file, any change to it means the
+# cached digest of the file can no longer be trusted
+def _stat_signature(st):
+    mtime_ns = getattr(st, 'st_mtime_ns', None)
+    if mtime_ns is None:
+        mtime_ns = int(st.st_mtime * 1000000000)
+    return (st.st_dev, st.st_ino, st.st_size, mtime_ns)
+
+class DigestCache(object):
+    '''On disk cache of file digests keyed on (dev, inode, size, mtime_ns)'''
+
+    def __init__(self, cache_path, hashfunc, max_entries):
+        self.hashfunc = hashfunc
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._pending = {}
+        self._used = []
+        self._stamp = int(time.time())
+        self._conn = sqlite3.connect(cache_path, timeout=60)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS digests ('
+            ' inode TEXT NOT NULL, algorithm TEXT NOT NULL,'
+            ' size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL,'
+            ' digest TEXT NOT NULL, used INTEGER NOT NULL,'
+            ' PRIMARY KEY (inode, algorithm))')
+        self._conn.execute(
+            'CREATE INDEX IF NOT EXISTS digests_used ON digests (used)')
+
+    def lookup(self, files):
+        '''Yield (filepath, digest) items of the (filepath, DirEntry) files,
+        digest is None for the files to hash. The stat comes from the DirEntry
+        of the walk when there is one'''
+        for filepath, entry in files:
+            st = os.stat(filepath) if entry is None else entry.stat()
+            dev, ino, size, mtime_ns = _stat_signature(st)
+            inode = '{}:{}'.format(dev, ino)
+            row = self._conn.execute(
+                'SELECT digest FROM digests WHERE inode = ? AND algorithm = ?'
+                ' AND size = ? AND mtime_ns = ?',
+                (inode, self.hashfunc, size, mtime_ns)).fetchone()
+            if row is None:
+                self.misses += 1
+                self._pending[filepath] = (inode, size, mtime_ns)
+                yield filepath, None
+            else:
+                self.hits += 1
+                self._used.append((self._stamp, inode, self.hashfunc))
+                yield filepath, str(row[0])
+
+    def store(self, filepath, hashvalue):
+        '''Record the digest of a file yielded by lookup, cached ones are skipped'''
+        if filepath not in self._pending:
+            return
+        inode, size, mtime_ns = self._pending.pop(filepath)
+        self._conn.execute(
+            'INSERT OR REPLACE INTO digests VALUES (?, ?, ?, ?, ?, ?)',
+            (inode, self.hashfunc, size, mtime_ns, hashvalue, self._stamp))
+
+    def close(self):
+        '''Save the cache, evicting the least recently used digests over max_entries'''
+        self._conn.executemany(
+            'UPDATE digests SET used = ? WHERE inode = ? AND algorithm = ?',
+            self._used)
+        count = self._conn.execute('SELECT COUNT(*) FROM digests').fetchone()[0]
+        if count > self.max_entries:
+            self._conn.execute(
+                'DELETE FROM digests WHERE rowid IN'
+                ' (SELECT rowid FROM digests ORDER BY used LIMIT ?)',
+                (count - self.max_entries,))
+        self._conn.commit()
+        self._conn.close()
+
+# Method to format a manifest line, paths with a newline or backslash are
+# escaped and flagged with a leading backslash like md5sum does
+def _manifest_line(relpath, hashvalue):
+    if b'\\' in relpath or b'\n' in relpath:
+        relpath = relpath.replace(b'\\', b'\\\\').replace(b'\n', b'\\n')
+        return b'\\' + hashvalue.encode('ascii') + b'  ' + relpath + b'\n'
+    return hashvalue.encode('ascii') + b'  ' + relpath + b'\n'
+
+# Method to parse a manifest line into (relpath, hashvalue)
+def _parse_manifest_line(line):
+    line = line.rstrip(b'\n')
+    escaped = line.startswith(b'\\')
+    if escaped:
+        line = line[1:]
+    hashvalue, _, relpath = line.partition(b'  ')
+    if escaped:
+        relpath = MANIFEST_ESCAPES.sub(
+            lambda m: b'\n' if m.group(1) == b'n' else m.group(1), relpath)
+    return relpath, hashvalue.decode('ascii')
+
+# Method to make a manifest path safe for the module result
+def _to_text(relpath):
+    return relpath.decode('utf-8', 'replace')
+
+class ManifestWriter(object):
+    '''Write the sorted per-file manifest of a dirhash to a file'''
+
+    def __init__(self, manifest_path, hashfunc):
+        self.manifest_path = manifest_path
+        self._tmp_path = manifest_path + '.tmp'
+        self._fp = open(self._tmp_path, 'wb')
+        self._fp.write(MANIFEST_HEADER.format(hashfunc).encode('ascii'))
+
+    def add(self, relpath, hashvalue):
+        self._fp.write(_manifest_line(relpath, hashvalue))
+
+    def close(self):
+        '''Replace the manifest, so it can be compared against in the same run'''
+        self._fp.close()
+        os.rename(self._tmp_path, self.manifest_path)
+
+class ManifestDiff(object):
+    '''Merge-join the sorted files of a dirhash against a stored manifest'''
+
+    def __init__(self, manifest_path, hashfunc):
+        self.added = []
+        self.removed = []
+        self.modified = []
+        self._fp = open(manifest_path, 'rb')
+        header = self._fp.readline().decode('ascii', 'replace')
+        if header != MANIFEST_HEADER.format(hashfunc):
+            self._fp.close()
+            raise ValueError('{} is not a {} manifest of get_checksum'.format(
+                manifest_path, hashfunc))
+        self._next = None
+        self._advance()
+
+    def _advance(self):
+        previous = self._next
+        line = self._fp.readline()
+        self._next = _parse_manifest_line(line) if line else None
+        if previous and self._next and self._next[0] <= previous[0]:
+            raise ValueError('{} is not sorted at {}'.format(
+                self._fp.name, _to_text(self._next[0])))
+
+    def add(self, relpath, hashvalue):
+        while self._next is not None and self._next[0] < relpath:
+            self.removed.append(_to_text(self._next[0]))
+            self._advance()
+        if self._next is not None and self._next[0] == relpath:
+            if self._next[1] != hashvalue:
+                self.modified.append(_to_text(relpath))
+            self._advance()
+        else:
+            self.added.append(_to_text(relpath))
+
+    def close(self):
+        '''Report the files left in the manifest as removed'''
+        while self._next is not None:
+            self.removed.append(_to_text(self._next[0]))
+            self._advance()
+        self._fp.close()
+
+# Method to pick the read size of a file, 64 KiB growing to 1 MiB for large files
+def _blocksize(size):
+    blocksize = MIN_BLOCKSIZE
+    while blocksize < MAX_BLOCKSIZE and blocksize * 64 < size:
+        blocksize *= 2
+    return blocksize
+
 # Method to perform the hash of a single file
-def _filehash(filepath, hashfunc):
+def _filehash(filepath, hashfunc, read_strategy='auto', fadvise=False):
+    hasher = hashfunc()
+    with open(filepath, 'rb') as fp:
+        st = os.fstat(fp.fileno())
+        if read_strategy == 'auto':
+            read_strategy = 'mmap' if st.st_size >= MMAP_THRESHOLD else 'readinto'
+        # mmap only works on non empty regular files
+        if read_strategy == 'mmap' and (st.st_size == 0
+                                        or not stat.S_ISREG(st.st_mode)):
+            read_strategy = 'readinto'
+        if fadvise and hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(fp.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        if read_strategy == 'mmap':
+            try:
+                mm = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+            except (EnvironmentError, ValueError, OverflowError):
+                # e.g. the file does not fit in the address space
+                read_strategy = 'readinto'
+            else:
+                try:
+                    if fadvise and hasattr(mm, 'madvise'):
+                        mm.madvise(mmap.MADV_SEQUENTIAL)
+                    hasher.update(mm)
+                finally:
+                    mm.close()
+        if read_strategy == 'readinto':
+            # Read into one reused buffer instead of a new bytes object per block
+            buf = bytearray(_blocksize(st.st_size))
+            view = memoryview(buf)
+            while True:
+                size = fp.readinto(buf)
+                if not size:
+                    break
+                hasher.update(view[:size])
+        elif read_strategy == 'read':
+            blocksize = _blocksize(st.st_size)
+            while True:
+                data = fp.read(blocksize)
+                if not data:
+                    break
+                hasher.update(data)
+    return hasher.hexdigest()
+
+# Method to perform the quick hash of a single file, from its size, mtime, its
+# first and last sample_size bytes and samples blocks evenly spaced in between
+def _quickhash(filepath, hashfunc, sample_size, samples):
     hasher = hashfunc()
-    blocksize = 64 * 1024
     with open(filepath, 'rb') as fp:
-        while True:
-            data = fp.read(blocksize)
-            if not data:
-                break
-            hasher.update(data)
+        size, mtime_ns = _stat_signature(os.fstat(fp.fileno()))[2:]
+        hasher.update('{} {}\n'.format(size, mtime_ns).encode('ascii'))
+        if size <= sample_size * (samples + 2):
+            # Small files are read whole
+            hasher.update(fp.read())
+        else:
+            last = size - sample_size
+            for i in range(samples + 2):
+                fp.seek(last * i // (samples + 1))
+                hasher.update(fp.read(sample_size))
     return hasher.hexdigest()
 
 # Method to reduce the individual hashes of each file
@@ -168,18 +956,37 @@ def _reduce_hash(hashlist, hashfunc):
         hasher.update(hashvalue.encode('utf-8'))
     return hasher.hexdigest()
 
+# Method to expand a path like the path type of the module arguments
+def _expand_path(path):
+    return os.path.expanduser(os.path.expandvars(path))
+
 # Method for getting arguments and running the main logic
 def run_module():
     # define the available arguments/parameters that a user can pass to
     # the module
     module_args = dict(
-        path=dict(required=True, type='path'),
+        path=dict(required=True, type='raw'),
         checksum_type=dict(type='str', default='md5', 
-                      choices=['md5', 'sha1', 'sha256', 'sha512']),
+                      choices=CHECKSUM_TYPES),
         exclude_files=dict(type='list', default=[]),
         exclude_extensions=dict(type='list', default=[]),
         ignore_hidden=dict(type='bool', default=False),
         follow_links=dict(type='bool', default=False),
+        workers=dict(type='int', default=1),
+        worker_type=dict(type='str', default='thread',
+                         choices=['thread', 'process']),
+        cache_path=dict(type='path', default=None),
+        cache_max_entries=dict(type='int', default=1000000),
+        read_strategy=dict(type='str', default='auto',
+                           choices=['auto', 'mmap', 'readinto', 'read']),
+        fadvise=dict(type='bool', default=False),
+        mode=dict(type='str', default='flat', choices=['flat', 'merkle', 'quick']),
+        quick_size=dict(type='int', default=64),
+        quick_samples=dict(type='int', default=8),
+        return_manifest=dict(type='bool', default=False),
+        prior_manifest=dict(type='dict', default=None),
+        manifest_path=dict(type='path', default=None),
+        compare_to=dict(type='path', default=None),
     )
 
     # seed the result dict in the object
@@ -214,16 +1021,108 @@ def run_module():
     exclude_extensions = module.params['exclude_extensions']
     ignore_hidden = module.params['ignore_hidden'] 
     follow_links = module.params['follow_links']
+    workers = module.params['workers']
+    worker_type = module.params['worker_type']
+    cache_path = module.params['cache_path']
+    cache_max_entries = module.params['cache_max_entries']
+    read_strategy = module.params['read_strategy']
+    fadvise = module.params['fadvise']
+    mode = module.params['mode']
+    quick_size = module.params['quick_size']
+    quick_samples = module.params['quick_samples']
+    return_manifest = module.params['return_manifest']
+    prior_manifest = module.params['prior_manifest']
+    manifest_path = module.params['manifest_path']
+    compare_to = module.params['compare_to']
 
-# Check if the path is a directory and calculate checksum
-    if os.path.isdir(path):
-        result['checksum_value'] = dirhash(path, checksum_type, exclude_files, 
-                                  ignore_hidden, follow_links, exclude_extensions)
+    if workers < 0:
+        module.fail_json(msg='workers must be 0 or a positive number', meta=result)
+
+    if not isinstance(path, list):
+        path = _expand_path(path)
+    elif mode == 'merkle' or manifest_path or compare_to:
+        module.fail_json(msg='mode merkle, manifest_path and compare_to need a single path',
+                         meta=result)
+
+    if checksum_type not in HASH_FUNCS:
+        fallback = [name for name in FALLBACK_TYPES if name in HASH_FUNCS][0]
+        module.warn('{} is not available on this host, using {} instead'.format(
+            checksum_type, fallback))
+        checksum_type = fallback
+    result['checksum_type'] = checksum_type
+
+    # Quick digests are cached and stored in manifests apart from full ones
+    quick = None
+    digest_type = checksum_type
+    if mode == 'quick':
+        if quick_size < 1 or quick_samples < 0:
+            module.fail_json(msg='quick_size must be positive and quick_samples 0 or more',
+                             meta=result)
+        quick = (quick_size * 1024, quick_samples)
+        digest_type = 'quick-{}-{}-{}'.format(checksum_type, quick_size, quick_samples)
+
+# Open the digest cache if one was requested
+    cache = None
+    if cache_path:
+        try:
+            cache = DigestCache(cache_path, digest_type, cache_max_entries)
+        except sqlite3.Error as e:
+            error = 'Cannot open cache {}: {}'.format(cache_path, e)
+            module.fail_json(msg=error, meta=result)
+
+    hash_options = dict(workers=workers, worker_type=worker_type, cache=cache,
+                        read_strategy=read_strategy, fadvise=fadvise, quick=quick)
+
+# Check if a list of paths was passed and calculate the checksum of each
+    if isinstance(path, list):
+        paths = dict((p, os.path.abspath(_expand_path(p))) for p in path)
+        for p, abspath in paths.items():
+            if not os.path.exists(abspath):
+                result['failed'] = True
+                error = '{} is not a valid path.'.format(p)
+                module.fail_json(msg=error, meta=result)
+        checksums = multi_dirhash(sorted(set(paths.values())), checksum_type,
+                                  exclude_files, ignore_hidden, follow_links,
+                                  exclude_extensions, **hash_options)
+        result['checksums'] = dict((p, checksums[abspath])
+                                   for p, abspath in paths.items())
+
+    elif os.path.isdir(path) and mode == 'merkle':
+        result['checksum_value'], manifest = merkle_dirhash(
+            path, checksum_type, exclude_files, ignore_hidden, follow_links,
+            exclude_extensions, prior_manifest, **hash_options)
+        if return_manifest:
+            result['manifest'] = manifest
+
+    elif os.path.isdir(path):
+        # The diff reads compare_to before the writer replaces it
+        manifests = []
+        try:
+            if compare_to:
+                manifests.append(ManifestDiff(compare_to, digest_type))
+            if manifest_path:
+                manifests.append(ManifestWriter(manifest_path, digest_type))
+        except (EnvironmentError, ValueError) as e:
+            module.fail_json(msg='Cannot open manifest: {}'.format(e), meta=result)
+        try:
+            result['checksum_value'] = dirhash(path, checksum_type, exclude_files, 
+                                      ignore_hidden, follow_links, exclude_extensions,
+                                      manifests, **hash_options)
+            for manifest in manifests:
+                manifest.close()
+        except ValueError as e:
+            module.fail_json(msg='Cannot compare manifest: {}'.format(e), meta=result)
+        if compare_to:
+            diff = manifests[0]
+            result['added'] = diff.added
+            result['removed'] = diff.removed
+            result['modified'] = diff.modified
 
 # Check if the path is a file and calculate the checksum
     elif os.path.isfile(path):
-        hasher = HASH_FUNCS.get(checksum_type)
-        result['checksum_value'] = _filehash(path, hasher)
+        hash_options['workers'] = 1
+        result['checksum_value'] = next(_iter_hashes([(path, None)], checksum_type,
+                                                     **hash_options))[1]
 
 # Fail if its neither a file nor a directory
     else:
@@ -231,6 +1130,11 @@ def run_module():
         error = '{} is not a valid path.'.format(path)
         module.fail_json(msg=error, meta=result)
 
+    if cache is not None:
+        cache.close()
+        result['cache_hits'] = cache.hits
+        result['cache_misses'] = cache.misses
+
     # in the event of a successful module execution, you will want to
     # simple AnsibleModule.exit_json(), passing the key/value results
     result['changed'] = True
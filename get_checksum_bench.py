@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+from __future__ import print_function
+import argparse
+import os
+import re
+import shutil
+import tempfile
+import time
+
+import get_checksum
+
+"""
+Description:
+  - Benchmark the serial and parallel hashing paths of the get_checksum module
+  - A synthetic tree of small and large files is generated in a temporary directory
+  - Every run is checked to produce the same checksum_value as the serial path
+  - With --walk only the directory walk and the file filters are timed, against the os.walk pipeline they replaced
+  - With --throughput every available checksum_type hashes one file through _filehash and its MiB/s are reported
+Usage:
+  get_checksum_bench.py [-n <files>] [-s <size_kb>] [-l <large_files>] [-w <workers>] [-t <type>] [-m <read_strategy>]
+  get_checksum_bench.py --walk [-n <files>] [-d <dir>]
+  get_checksum_bench.py --throughput [--file_mb <size>] [-m <read_strategy>]
+Example:
+  get_checksum_bench.py -n 20000 -s 16 -l 4 -w 8 -t sha512
+  get_checksum_bench.py --walk -n 200000 -s 0 -l 0
+Note:
+  - Needs the ansible python package, as the module is imported directly
+  - The page cache is warm after the first run, pass -d to benchmark a real tree instead
+"""
+
+parser = argparse.ArgumentParser(description='Benchmark the get_checksum hashing paths')
+parser.add_argument('-d', '--dir', type=str, default=None, help='Existing directory to hash instead of a synthetic tree')
+parser.add_argument('-n', '--files', type=int, default=5000, help='Number of small files in the synthetic tree')
+parser.add_argument('-s', '--size_kb', type=int, default=8, help='Size of each small file in KiB')
+parser.add_argument('-l', '--large_files', type=int, default=2, help='Number of 64 MiB files in the synthetic tree')
+parser.add_argument('-w', '--workers', type=int, default=0, help='Workers of the parallel runs, 0 for one per CPU')
+parser.add_argument('-t', '--type', choices=sorted(get_checksum.HASH_FUNCS), default='md5', help='Checksum algorithm')
+parser.add_argument('-m', '--read_strategy', choices=['auto', 'mmap', 'readinto', 'read'], default='auto', help='How the files are read')
+parser.add_argument('-r', '--repeat', type=int, default=3, help='Runs per configuration, the best one is reported')
+parser.add_argument('--walk', action='store_true', help='Only benchmark the directory walk and the file filters')
+parser.add_argument('--throughput', action='store_true', help='Benchmark the hashing throughput of every checksum_type')
+parser.add_argument('--file_mb', type=int, default=256, help='Size of the file hashed by --throughput in MiB')
+
+# The filters used by the walk benchmark
+EXCLUDE_FILES = ['f000001.dat', 'f000002.dat', 'README']
+EXCLUDE_EXTENSIONS = ['tmp', 'bak', 'swp']
+
+
+def make_tree(dirname, files, size_kb, large_files):
+    '''Create a synthetic tree with 100 files per directory, some hidden or excluded'''
+    block = os.urandom(size_kb * 1024)
+    for i in range(files):
+        subdir = os.path.join(dirname, '{}d{:04d}'.format('.' if i // 100 % 10 == 9 else '', i // 100))
+        if not os.path.isdir(subdir):
+            os.makedirs(subdir)
+        name = '{}f{:06d}.{}'.format('.' if i % 50 == 49 else '', i, 'tmp' if i % 20 == 19 else 'dat')
+        shift = i % len(block) if block else 0
+        with open(os.path.join(subdir, name), 'wb') as fp:
+            fp.write(block[shift:] + block[:shift])
+    for i in range(large_files):
+        with open(os.path.join(dirname, 'large{:02d}.img'.format(i)), 'wb') as fp:
+            for _ in range(64):
+                fp.write(os.urandom(1024 * 1024))
+
+
+def legacy_walk(dirname, exclude_files, ignore_hidden, followlinks, exclude_extensions):
+    '''The os.walk pipeline dirhash used before the scandir walk'''
+    for root, dirs, files in os.walk(dirname, topdown=True, followlinks=followlinks):
+        if ignore_hidden:
+            if not re.search(r'/\.', root):
+                for f in files:
+                    if (not f.startswith('.') and not re.search(r'/\.', f)
+                            and f not in exclude_files
+                            and f.split('.')[-1:][0] not in exclude_extensions):
+                        yield os.path.join(root, f)
+        else:
+            for f in files:
+                if (f not in exclude_files
+                        and f.split('.')[-1:][0] not in exclude_extensions):
+                    yield os.path.join(root, f)
+
+
+def scandir_walk(dirname, exclude_files, ignore_hidden, followlinks, exclude_extensions):
+    '''The walk of dirhash'''
+    excluded = get_checksum._exclude_matcher(exclude_files, exclude_extensions)
+    return (filepath for filepath, entry in get_checksum._walk_files(dirname, excluded, ignore_hidden, followlinks))
+
+
+def bench_walk(dirname, repeat):
+    '''Time the walks with and without ignore_hidden and check they list the same files'''
+    for ignore_hidden in (False, True):
+        expected = None
+        for name, walk in (('os.walk', legacy_walk), ('scandir', scandir_walk)):
+            best = None
+            for _ in range(repeat):
+                start = time.time()
+                files = sorted(walk(dirname, EXCLUDE_FILES, ignore_hidden, False, EXCLUDE_EXTENSIONS))
+                elapsed = time.time() - start
+                best = elapsed if best is None else min(best, elapsed)
+            if expected is None:
+                expected = files
+            status = 'ok' if files == expected else 'MISMATCH'
+            print('{:<8} ignore_hidden={:<5} {:>8.3f}s  {} files  {}'.format(
+                name, str(ignore_hidden), best, len(files), status))
+
+
+def bench_throughput(dirname, file_mb, read_strategy, repeat):
+    '''Hash one file with every available algorithm, from a warm page cache'''
+    filepath = os.path.join(dirname, 'throughput.img')
+    with open(filepath, 'wb') as fp:
+        for _ in range(file_mb):
+            fp.write(os.urandom(1024 * 1024))
+    for name in get_checksum.CHECKSUM_TYPES:
+        hashfunc = get_checksum.HASH_FUNCS.get(name)
+        if hashfunc is None:
+            print('{:<8} not available'.format(name))
+            continue
+        best = None
+        for _ in range(repeat):
+            start = time.time()
+            get_checksum._filehash(filepath, hashfunc, read_strategy)
+            elapsed = time.time() - start
+            best = elapsed if best is None else min(best, elapsed)
+        print('{:<8} {:>8.1f} MiB/s'.format(name, file_mb / best))
+
+
+def timed_dirhash(dirname, hashfunc, repeat, **kwargs):
+    '''Return the checksum and the best wall clock time of repeat runs'''
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        checksum = get_checksum.dirhash(dirname, hashfunc, [], False, False, [], **kwargs)
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return checksum, best
+
+
+def main():
+    args = parser.parse_args()
+    tmpdir = None
+    dirname = args.dir
+    if args.throughput:
+        tmpdir = tempfile.mkdtemp(prefix='get_checksum_bench')
+        try:
+            bench_throughput(tmpdir, args.file_mb, args.read_strategy, args.repeat)
+        finally:
+            shutil.rmtree(tmpdir)
+        return
+    if dirname is None:
+        tmpdir = tempfile.mkdtemp(prefix='get_checksum_bench')
+        dirname = tmpdir
+        make_tree(dirname, args.files, args.size_kb, args.large_files)
+    try:
+        if args.walk:
+            bench_walk(dirname, args.repeat)
+            return
+        runs = [
+            ('serial', dict(workers=1)),
+            ('thread', dict(workers=args.workers, worker_type='thread')),
+            ('process', dict(workers=args.workers, worker_type='process')),
+        ]
+        expected = None
+        for name, kwargs in runs:
+            checksum, elapsed = timed_dirhash(dirname, args.type, args.repeat,
+                                              read_strategy=args.read_strategy, **kwargs)
+            if expected is None:
+                expected = checksum
+            status = 'ok' if checksum == expected else 'MISMATCH'
+            print('{:<8} {:>8.3f}s  {}  {}'.format(name, elapsed, checksum, status))
+    finally:
+        if tmpdir is not None:
+            shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -6,9 +6,14 @@ try:
     from ruamel.yaml import YAML
 except ImportError:
     raise ImportError('cannot import ruamel.yaml')
-import collections
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
 from copy import deepcopy
+import errno
 import os
+import shutil
 import sys
 
 """
@@ -16,27 +21,41 @@ Description:
   - This Script is to update a key value in yaml file of varying key depth
   - Supports python version 2 and 3
   - As we are using the ruamel.yaml module the comments and order will be preserved
+  - With -u many keys are updated with one load and one write of the file
 Usage: 
   update_yaml.py -k <key_path_in_yaml_file> -v <value you want to update> -f <file_path> -t <type>
+  update_yaml.py -u <updates_file> -f <file_path>
 Example:
   update_yaml.py -k foo.bar -v abc -f dummy.txt -t str
+  printf 'foo.bar=abc\nfoo.port=8080:int\n' | update_yaml.py -u - -f dummy.txt
 Note:
   - key_path should always be used with separator '.'
   - value will be string by default unless specified with -t parameter
   - file_path can either be relative or absolute path
   - Supported types with -t are str, int, float and bool. 
   - Updating lists and dictionaries are not yet supported
+  - The updates file has one key_path=value:type update per line, - reads it from stdin
+  - The :type suffix is optional, a value ending with :<type> needs an explicit :str suffix
+  - Blank lines and lines starting with # are skipped, a later update of a key wins
+  - The file is written to a temporary file renamed over it, so it is never left half written
+  - A symlinked file_path is followed, the file it points to is updated with its mode and owner kept
 
 """
 
 yaml = YAML()
 
+TYPES = ['str','int','float', 'bool']
+
 parser = argparse.ArgumentParser(description='Update the yaml files with keys')
-parser.add_argument('-k', '--key_path', type=str, required=True, help='Key path in yaml file to be updated')
+keys = parser.add_mutually_exclusive_group(required=True)
+keys.add_argument('-k', '--key_path', type=str, help='Key path in yaml file to be updated')
+keys.add_argument('-u', '--updates', type=str, help='Path of a file of key_path=value:type updates, one per line, - for stdin')
 parser.add_argument('-f', '--file_path', type=str, required=True, help='Absolute Path of Input File')
-parser.add_argument('-v', '--key_value', type=str, required=True, help='Value for key to be updated')
-parser.add_argument('-t', '--type', choices=['str','int','float', 'bool'], required=False, default='str', help='Type of value to be updated')
+parser.add_argument('-v', '--key_value', type=str, required=False, help='Value for key to be updated')
+parser.add_argument('-t', '--type', choices=TYPES, required=False, default='str', help='Type of value to be updated')
 args = parser.parse_args()
+if args.key_path is not None and args.key_value is None:
+    parser.error('argument -v/--key_value is required with -k/--key_path')
 
 def input_to_lst(keypath, value):
     '''To convert the input parameters to a list'''
@@ -58,19 +77,43 @@ def load_yaml(file_path):
     else:
         return file_content_dict
 
-def gen_dict(lst):
-    '''Generating a dictionary based on input keypath and value'''
-    if len(lst) == 2:
-        return {lst[0]:lst[1]}
-    else:
-        return {lst[0]:gen_dict(lst[1:])}
+def read_updates(updates_file):
+    '''Read the (key_path, value, type) updates of a file, - for stdin'''
+    updates = []
+    fp = sys.stdin if updates_file == '-' else open(updates_file)
+    try:
+        for line in fp:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if '=' not in line:
+                raise ValueError('Error: Update {} should be in format of <key_path>=<value>:<type>'.format(line))
+            key_path, value = line.split('=', 1)
+            key_type = 'str'
+            if ':' in value and value.rsplit(':', 1)[1] in TYPES:
+                value, key_type = value.rsplit(':', 1)
+            updates.append((key_path.strip(), value, key_type))
+    finally:
+        if fp is not sys.stdin:
+            fp.close()
+    return updates
+
+def add_update(updates, lst):
+    '''Adding an input keypath and value list to the dictionary of all the updates'''
+    node = updates
+    for key in lst[:-2]:
+        node = node.setdefault(key, {})
+        if not isinstance(node, Mapping):
+            raise TypeError("Error: key path conflict, cannot update already existing string with new keypath")
+    node[lst[-2]] = lst[-1]
+    return updates
 
 def merge(dict1, dict2):
     ''' Return a new dictionary by merging two dictionaries recursively. '''
     try:
         result = deepcopy(dict1)
         for key, value in six.iteritems(dict2):
-            if isinstance(value, collections.Mapping):
+            if isinstance(value, Mapping):
                 result[key] = merge(result.get(key, {}), value)
             else:
                 result[key] = deepcopy(dict2[key])
@@ -82,15 +125,36 @@ def merge(dict1, dict2):
         return result 
 
 def update_yaml_file(file_path, file_content_dict):
-    '''To write the filewith the updated content'''
+    '''To write the filewith the updated content, through a temporary file
+    renamed over it. A symlink is followed, the file it points to is
+    replaced and keeps its mode and owner'''
+    real_path = os.path.realpath(file_path)
+    tmp_file = '{}.{}.tmp'.format(real_path, os.getpid())
     try: 
-        with open(file_path,'w') as yaml_file:
+        with open(tmp_file,'w') as yaml_file:
             yaml.dump(file_content_dict, yaml_file)
+        shutil.copymode(real_path, tmp_file)
+        copy_owner(real_path, tmp_file)
+        os.rename(tmp_file, real_path)
     except:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
         raise Exception('Error: Not able to open file to write')
     else: 
         print('{} updated!'.format(file_path))
 
+def copy_owner(src, dst):
+    '''Copy the uid and gid of src to dst, which a non-root user may not be
+    allowed to do'''
+    if not hasattr(os, 'chown'):
+        return
+    st = os.stat(src)
+    try:
+        os.chown(dst, st.st_uid, st.st_gid)
+    except OSError as e:
+        if e.errno != errno.EPERM:
+            raise
+
 def determine_value_type(key_value, key_type='str'):
     if key_type == 'bool':
         if key_value in ['true', 'True']:
@@ -124,9 +188,15 @@ def main():
         print("Error: File --> {} not found".format(args.file_path))
         sys.exit(1)
 
-    key_value = determine_value_type(args.key_value, args.type)
-    key_value_list = input_to_lst(args.key_path, key_value)
-    dict_to_merge = gen_dict(key_value_list)
+    if args.updates is not None:
+        updates = read_updates(args.updates)
+    else:
+        updates = [(args.key_path, args.key_value, args.type)]
+    # All the updates are merged into the loaded file at once
+    dict_to_merge = {}
+    for key_path, value, key_type in updates:
+        key_value = determine_value_type(value, key_type)
+        add_update(dict_to_merge, input_to_lst(key_path, key_value))
     file_content_dict = merge(file_content_dict, dict_to_merge)
     update_yaml_file(args.file_path, file_content_dict)
 
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+from __future__ import print_function
+import argparse
+import filecmp
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+"""
+Description:
+  - Benchmark the batch mode of update_yaml against one update_yaml run per key update
+  - A synthetic yaml file of nested sections is generated in a temporary directory, the updates are random keys of it
+  - Every update count is run both ways on a copy of the file, the two updated files are checked to be the same
+Usage:
+  update_yaml_bench.py [-s <sections>] [-k <keys>] [-c <counts>]
+Example:
+  update_yaml_bench.py -s 200 -k 20 -c 1 10 40 100
+Note:
+  - Needs the ruamel.yaml and six python packages, update_yaml.py is run as a script next to this one
+"""
+
+parser = argparse.ArgumentParser(description='Benchmark the update_yaml batch mode')
+parser.add_argument('-s', '--sections', type=int, default=100, help='Number of top level sections in the synthetic file')
+parser.add_argument('-k', '--keys', type=int, default=20, help='Number of keys per section')
+parser.add_argument('-c', '--counts', type=int, nargs='+', default=[1, 10, 40, 100], help='Update counts to benchmark')
+
+UPDATE_YAML = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'update_yaml.py')
+DEVNULL = open(os.devnull, 'w')
+
+
+def make_yaml(path, sections, keys):
+    '''Write sections of keys holding strings, ints and bools, with comments'''
+    with open(path, 'w') as fp:
+        fp.write('# synthetic configuration\n')
+        for i in range(sections):
+            fp.write('section{:04d}:\n'.format(i))
+            fp.write('  # settings of section {}\n'.format(i))
+            for j in range(keys):
+                value = ['value{}'.format(j), str(j * 10), 'true'][j % 3]
+                fp.write('  key{:03d}: {}\n'.format(j, value))
+
+
+def make_updates(count, sections, keys):
+    '''Random (key_path, value, type) updates, some of them add new keys'''
+    rng = random.Random(count)
+    updates = []
+    for i in range(count):
+        key_path = 'section{:04d}.key{:03d}'.format(rng.randrange(sections), rng.randrange(keys + 2))
+        key_type = rng.choice(['str', 'int', 'bool'])
+        value = {'str': 'updated{}'.format(i), 'int': str(i), 'bool': rng.choice(['true', 'false'])}[key_type]
+        updates.append((key_path, value, key_type))
+    return updates
+
+
+def run_single(path, updates):
+    '''One update_yaml run per update'''
+    for key_path, value, key_type in updates:
+        subprocess.check_call([sys.executable, UPDATE_YAML, '-k', key_path, '-v', value, '-t', key_type, '-f', path],
+                              stdout=DEVNULL)
+
+
+def run_batch(path, updates):
+    '''One update_yaml run with the updates on stdin'''
+    lines = ''.join('{}={}:{}\n'.format(key_path, value, key_type) for key_path, value, key_type in updates)
+    proc = subprocess.Popen([sys.executable, UPDATE_YAML, '-u', '-', '-f', path],
+                            stdin=subprocess.PIPE, stdout=DEVNULL)
+    proc.communicate(lines.encode('utf-8'))
+    if proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, UPDATE_YAML)
+
+
+def main():
+    args = parser.parse_args()
+    tmpdir = tempfile.mkdtemp(prefix='update_yaml_bench')
+    try:
+        source = os.path.join(tmpdir, 'source.yaml')
+        make_yaml(source, args.sections, args.keys)
+        print('{} sections x {} keys, {} bytes'.format(args.sections, args.keys, os.path.getsize(source)))
+        for count in args.counts:
+            updates = make_updates(count, args.sections, args.keys)
+            results = []
+            for name, run in [('single', run_single), ('batch', run_batch)]:
+                path = os.path.join(tmpdir, '{}.yaml'.format(name))
+                shutil.copy(source, path)
+                start = time.time()
+                run(path, updates)
+                elapsed = time.time() - start
+                results.append(path)
+                status = 'ok' if filecmp.cmp(results[0], path, shallow=False) else 'MISMATCH'
+                print('{:>5} updates  {:<7} {:>8.3f}s  {}'.format(count, name, elapsed, status))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()